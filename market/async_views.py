@@ -0,0 +1,172 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from . import views
+from .cache import product_cache
+from .models import Customer, Product
+from .pagination import decode_cursor, page_params
+from .routers import replica_view
+from .serializers import JsonResponse, ndjson_line
+
+
+"""
+    Async versions of the read endpoints, routed instead of the ones in
+    views.py when MARKET_ASYNC_VIEWS is on (the ASGI deployment).
+"""
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.MARKET_ASYNC_DB_WORKERS, thread_name_prefix='market-db',
+        )
+    return _executor
+
+
+def _call(func, args, kwargs):
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_in_pool(func, *args, **kwargs):
+    # Runs synchronous database work on the bounded pool, keeping the
+    # caller's context variables.
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, _call, func, args, kwargs)
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), call)
+
+
+def customer_id(request):
+    if request.user.is_authenticated:
+        return request.shopper.customer_id
+    return False
+
+
+def ndjson_response(load_page, collection):
+    # Streams a list page by page; every page is its own keyset query so no
+    # database cursor has to outlive a call on the pool.
+    async def lines():
+        cursor = None
+        while True:
+            page = await run_in_pool(load_page, settings.MARKET_STREAM_CHUNK_SIZE, cursor)
+            for row in page[collection]:
+                yield ndjson_line(row)
+            if page['next'] is None:
+                return
+            cursor = decode_cursor(page['next'])
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+
+
+async def product_result(request, pk):
+    if pk:
+        try:
+            data = await product_cache.aget(('product', pk), lambda: run_in_pool(Product.get_json.query_result, pk=pk))
+            return JsonResponse(data, status=200)
+        except Product.DoesNotExist:
+            return JsonResponse({"message": "Product Not Found."}, status=404)
+    keyword = request.GET.get('search')
+    if views.wants_stream(request):
+        return ndjson_response(functools.partial(Product.get_json.page_result, keyword=keyword), 'products')
+    columns = views.wants_columns(request)
+    if views.wants_page(request):
+        try:
+            limit, cursor = page_params(request.GET)
+            return JsonResponse(await product_cache.aget(
+                ('page', limit, cursor, keyword, columns),
+                lambda: run_in_pool(Product.get_json.page_result, limit, cursor, keyword=keyword, columns=columns),
+            ), status=200)
+        except ValueError:
+            return JsonResponse({"message": "bad pagination parameters."}, status=400)
+    elif views.has_filters(request):
+        try:
+            keyword = request.GET['search']
+            return JsonResponse(await product_cache.aget(
+                ('search', keyword, columns),
+                lambda: run_in_pool(Product.get_json.product_search_result, keyword=keyword, columns=columns),
+            ), status=200)
+        except Exception:
+            return JsonResponse({"message": "Product Not Found."}, status=404)
+    else:
+        return JsonResponse(await run_in_pool(Product.get_json.list_result, columns), status=200)
+
+
+@replica_view
+async def product_show(request, pk=None):
+    if request.method == 'GET':
+        version, modified = await product_cache.astate()
+        etag = 'W/"{}"'.format(version)
+        response = get_conditional_response(request, etag=etag, last_modified=int(modified))
+        if response is None:
+            response = await product_result(request, pk)
+        response.headers.setdefault('ETag', etag)
+        response.headers.setdefault('Last-Modified', http_date(modified))
+        return response
+    else:
+        return JsonResponse({"message": "wrong request method."}, status=400)
+
+
+@replica_view
+async def customer_show(request, pk=None):
+    if request.method == 'GET':
+        if pk:
+            data = await Customer.get_json.detail_values(pk=pk).afirst()
+            if data is None:
+                return JsonResponse({"message": "Customer Not Found."}, status=404)
+            return JsonResponse(Customer.get_json.serializer.to_dict(data), status=200)
+        keyword = request.GET.get('search')
+        if views.wants_stream(request):
+            return ndjson_response(functools.partial(Customer.get_json.page_result, keyword=keyword), 'customers')
+        columns = views.wants_columns(request)
+        if views.wants_page(request):
+            try:
+                limit, cursor = page_params(request.GET)
+                return JsonResponse(await run_in_pool(
+                    Customer.get_json.page_result, limit, cursor, keyword=keyword, columns=columns,
+                ), status=200)
+            except ValueError:
+                return JsonResponse({"message": "bad pagination parameters."}, status=400)
+        elif views.has_filters(request):
+            try:
+                keyword = request.GET['search']
+                return JsonResponse(await run_in_pool(
+                    Customer.get_json.customer_search_result, keyword=keyword, columns=columns,
+                ), status=200)
+            except Exception:
+                return JsonResponse({"message": "Customer Not Found."}, status=404)
+        else:
+            return JsonResponse(await run_in_pool(Customer.get_json.list_result, columns), status=200)
+    else:
+        return JsonResponse({"message": "wrong request method."}, status=400)
+
+
+async def customer_profile(request):
+    if request.method == 'GET':
+        pk = await run_in_pool(customer_id, request)
+        if pk is not False:
+            data = await Customer.get_json.detail_values(pk=pk).afirst() if pk else None
+            if data is None:
+                return JsonResponse({"message": "Customer Not Found."}, status=404)
+            return JsonResponse(Customer.get_json.serializer.to_dict(data), status=200)
+        else:
+            return JsonResponse({"message": "You are not logged in."}, status=403)
+    else:
+        return JsonResponse({"message": "wrong request method."}, status=400)
+
+
+async def cart_show(request):
+    return await run_in_pool(views.cart_show, request)
@@ -0,0 +1,175 @@
+import contextlib
+import io
+import math
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.testcases import LiveServerThread, _StaticFilesHandler
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment,
+)
+from django.utils import timezone
+
+from .models import Customer, Order, OrderRow, Product
+
+
+def percentile(ordered, fraction):
+    # Nearest-rank percentile of an already sorted list.
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies, elapsed, **extra):
+    ordered = sorted(latencies)
+    summary = {
+        'requests': len(ordered),
+        'throughput': round(len(ordered) / elapsed, 1) if elapsed else None,
+        'p50_ms': percentile(ordered, 0.50),
+        'p95_ms': percentile(ordered, 0.95),
+        'p99_ms': percentile(ordered, 0.99),
+    }
+    for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+        if summary[key] is not None:
+            summary[key] = round(summary[key] * 1000, 2)
+    summary.update(extra)
+    return summary
+
+
+@contextlib.contextmanager
+def test_database(using=DEFAULT_DB_ALIAS, name=None):
+    # A throwaway copy of the database (as the test runner builds it) and
+    # the test environment the test Client needs. `name` overrides the test
+    # database name, e.g. a file so SQLite can be shared between processes.
+    connection = connections[using]
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    if name is not None:
+        test_settings['NAME'] = name
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        test_settings['NAME'] = old_test_name
+
+
+def measure(call, count):
+    # Calls `call` `count` times; returns the summary and the queries each
+    # call ran, counted on the last one.
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(count):
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as queries:
+            began = time.perf_counter()
+            call()
+            latencies.append(time.perf_counter() - began)
+    return summarize(latencies, time.perf_counter() - started, queries=len(queries))
+
+
+BENCH_PASSWORD = 'bench-password'
+
+
+def created_ids(model, objects, using):
+    # Primary keys of rows just made by bulk_create, for backends that do
+    # not return them.
+    if objects and objects[0].pk is None:
+        ids = list(model.objects.using(using).order_by('-pk').values_list('pk', flat=True)[:len(objects)])
+        for obj, pk in zip(objects, reversed(ids)):
+            obj.pk = pk
+    return objects
+
+
+def seed_dataset(products=1000, customers=200, orders=2000, rows_per_order=3, seed=0,
+                 batch_size=1000, using=DEFAULT_DB_ALIAS):
+    # Synthetic products, customers (all with BENCH_PASSWORD, hashed once)
+    # and historical orders spread over the last year, written with
+    # bulk_create only.
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    product_list = created_ids(Product, Product.objects.using(using).bulk_create([
+        Product(code='p{:06d}'.format(i), name='product {} {}'.format(rng.choice(WORDS), i),
+                price=rng.randint(1, 500), inventory=rng.randint(100, 10000))
+        for i in range(products)
+    ], batch_size=batch_size), using)
+    password = make_password(BENCH_PASSWORD)
+    users = created_ids(User, User.objects.using(using).bulk_create([
+        User(username='user{:06d}'.format(i), password=password,
+             first_name=rng.choice(WORDS).title(), last_name=rng.choice(WORDS).title())
+        for i in range(customers)
+    ], batch_size=batch_size), using)
+    customer_list = []
+    for user in users:
+        address = '{} {} street'.format(rng.randint(1, 999), rng.choice(WORDS))
+        customer_list.append(Customer(
+            user=user, phone='0{:09d}'.format(user.pk), address=address, balance=10 ** 7,
+            search_document=Customer.build_search_document(user, address),
+        ))
+    customer_list = created_ids(Customer, Customer.objects.using(using).bulk_create(customer_list, batch_size=batch_size), using)
+    now = timezone.now()
+    order_list, order_rows = [], []
+    for _ in range(orders if customer_list and product_list else 0):
+        rows = rng.sample(product_list, min(rows_per_order, len(product_list)))
+        amounts = [rng.randint(1, 5) for _ in rows]
+        order_list.append(Order(
+            customer=rng.choice(customer_list),
+            status=rng.choice([Order.STATUS_SUBMITTED, Order.STATUS_SENT, Order.STATUS_CANCELED]),
+            total_price=sum(product.price * amount for product, amount in zip(rows, amounts)),
+        ))
+        order_rows.append((rows, amounts))
+    order_list = created_ids(Order, Order.objects.using(using).bulk_create(order_list, batch_size=batch_size), using)
+    for order in order_list:
+        # order_time is auto_now_add, so it is backdated after the insert.
+        order.order_time = now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+        order.submitted_at = order.order_time + timedelta(seconds=rng.randint(0, 3600))
+    Order.objects.using(using).bulk_update(order_list, ['order_time', 'submitted_at'], batch_size=batch_size)
+    OrderRow.objects.using(using).bulk_create([
+        OrderRow(order=order, product=product, amount=amount, unit_price=product.price,
+                 product_code=product.code, product_name=product.name)
+        for order, (rows, amounts) in zip(order_list, order_rows)
+        for product, amount in zip(rows, amounts)
+    ], batch_size=batch_size)
+    call_command('rebuild_sales_rollups', database=using, stdout=io.StringIO())
+    return {
+        'products': len(product_list), 'customers': len(customer_list), 'orders': len(order_list),
+        'order_rows': sum(len(rows) for rows, _ in order_rows),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+WORDS = [
+    'apple', 'bread', 'butter', 'cheese', 'coffee', 'flour', 'honey', 'juice', 'lemon', 'milk',
+    'olive', 'orange', 'pasta', 'pepper', 'rice', 'salt', 'sugar', 'tea', 'tomato', 'yogurt',
+]
+
+
+@contextlib.contextmanager
+def live_server(host='127.0.0.1'):
+    # Serves the project from a thread of this process on a free port, the
+    # way LiveServerTestCase does, sharing in-memory SQLite connections.
+    shared = {}
+    for connection in connections.all():
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            connection.inc_thread_sharing()
+            shared[connection.alias] = connection
+    server = LiveServerThread(host, _StaticFilesHandler, connections_override=shared, port=0)
+    server.daemon = True
+    with override_settings(ALLOWED_HOSTS=[host]):
+        server.start()
+        server.is_ready.wait()
+        try:
+            if server.error:
+                raise server.error
+            yield server
+        finally:
+            server.terminate()
+            for connection in shared.values():
+                connection.dec_thread_sharing()
@@ -0,0 +1,137 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .routers import primary_reads
+
+
+class LRUCache:
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                self.data.move_to_end(key)
+            except KeyError:
+                return default
+            return self.data[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+class VersionedCache:
+    # Read-through cache whose keys embed a version counter kept in Django's
+    # cache; bumping the version invalidates every entry at once, in every
+    # process sharing that cache (so not with LocMemCache once there are
+    # several workers; see the market.W001 check). Entries go to a bounded
+    # in-process LRU tier first.
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.version_key = prefix + ':version'
+        self.modified_key = prefix + ':modified'
+        self._local = None
+
+    @property
+    def backend(self):
+        return caches[settings.MARKET_CACHE_ALIAS]
+
+    @property
+    def local(self):
+        if self._local is None:
+            self._local = LRUCache(settings.MARKET_CACHE_LRU_SIZE)
+        return self._local
+
+    def key(self, version, key):
+        digest = hashlib.md5(repr(key).encode('utf-8')).hexdigest()
+        return '{}:{}:{}'.format(self.prefix, version, digest)
+
+    def state(self):
+        state = self.backend.get_many([self.version_key, self.modified_key])
+        if self.version_key not in state or self.modified_key not in state:
+            # Start from the clock so versions never repeat after a flush.
+            now = time.time()
+            self.backend.add(self.version_key, int(now * 1000), None)
+            self.backend.add(self.modified_key, now, None)
+            state = self.backend.get_many([self.version_key, self.modified_key])
+        return state[self.version_key], state[self.modified_key]
+
+    def etag(self):
+        return 'W/"{}"'.format(self.state()[0])
+
+    def last_modified(self):
+        return self.state()[1]
+
+    def invalidate(self):
+        try:
+            self.backend.incr(self.version_key)
+        except ValueError:
+            self.backend.add(self.version_key, int(time.time() * 1000), None)
+        self.backend.set(self.modified_key, time.time(), None)
+
+    def invalidate_on_commit(self, using=None):
+        transaction.on_commit(self.invalidate, using=using)
+
+    def get(self, key, loader):
+        full_key = self.key(self.state()[0], key)
+        value = self.local.get(full_key)
+        if value is None:
+            value = self.backend.get(full_key)
+            if value is None:
+                # Entries are shared by every client, so they are never
+                # filled from a replica that may lag behind.
+                with primary_reads():
+                    value = loader()
+                self.backend.set(full_key, value, settings.MARKET_CACHE_TIMEOUT)
+            self.local.set(full_key, value)
+        return value
+
+    async def astate(self):
+        state = await self.backend.aget_many([self.version_key, self.modified_key])
+        if self.version_key not in state or self.modified_key not in state:
+            return await sync_to_async(self.state)()
+        return state[self.version_key], state[self.modified_key]
+
+    async def aget(self, key, loader):
+        # Same as get() but `loader` is a coroutine function.
+        full_key = self.key((await self.astate())[0], key)
+        value = self.local.get(full_key)
+        if value is None:
+            value = await self.backend.aget(full_key)
+            if value is None:
+                with primary_reads():
+                    value = await loader()
+                await self.backend.aset(full_key, value, settings.MARKET_CACHE_TIMEOUT)
+            self.local.set(full_key, value)
+        return value
+
+
+product_cache = VersionedCache('market:product')
+
+
+def product_etag(request, *args, **kwargs):
+    return product_cache.etag()
+
+
+def product_last_modified(request, *args, **kwargs):
+    return datetime.fromtimestamp(product_cache.last_modified(), tz=timezone.utc)
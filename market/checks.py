@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+# Backends whose data lives in one process.
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+# Session engines that keep sessions in the cache.
+CACHED_SESSION_ENGINES = {
+    'django.contrib.sessions.backends.cache',
+    'django.contrib.sessions.backends.cached_db',
+}
+
+
+def process_local(alias):
+    return settings.CACHES.get(alias, {}).get('BACKEND') in PROCESS_LOCAL_CACHES
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    if settings.MARKET_WORKERS <= 1:
+        return []
+    uses = []
+    if process_local(settings.MARKET_CACHE_ALIAS):
+        uses.append('the product cache version, the revoked tokens and the primary reads of token clients (MARKET_CACHE_ALIAS)')
+    if settings.SESSION_ENGINE in CACHED_SESSION_ENGINES and process_local(settings.SESSION_CACHE_ALIAS):
+        uses.append('the sessions (SESSION_ENGINE)')
+    if not uses:
+        return []
+    return [Warning(
+        'There are {} worker processes but a per-process cache holds {}.'.format(
+            settings.MARKET_WORKERS, ' and '.join(uses),
+        ),
+        hint='Changes made in one process, such as product updates, logouts and token '
+             'revocations, do not reach the others; configure a shared backend such as Redis '
+             "(MARKET_REDIS_URL), or keep SESSION_ENGINE on 'db'.",
+        id='market.W001',
+    )]
@@ -0,0 +1,97 @@
+import re
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+"""
+    Content codings for CompressionMiddleware: gzip always, brotli when the
+    brotli package is installed.
+"""
+
+
+FLUSH_EVERY = 64 * 1024
+
+_CODING = re.compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+def available():
+    # In order of preference.
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def negotiate(accept_encoding):
+    # The preferred available coding the client accepts, or None.
+    weights = {}
+    for part in accept_encoding.split(','):
+        match = _CODING.match(part)
+        if match:
+            try:
+                weights[match.group(1).lower()] = float(match.group(2) or 1)
+            except ValueError:
+                continue
+    best, best_weight = None, 0
+    for coding in available():
+        weight = weights.get(coding, weights.get('*', 0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+class Compressor:
+
+    def __init__(self, coding, level=None):
+        self.coding = coding
+        if coding == 'br':
+            self.compressor = brotli.Compressor(quality=5 if level is None else level)
+        else:
+            # wbits=31 writes a gzip header and trailer.
+            self.compressor = zlib.compressobj(6 if level is None else level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        if self.coding == 'br':
+            return self.compressor.process(data)
+        return self.compressor.compress(data)
+
+    def flush(self):
+        # Emits everything compressed so far.
+        if self.coding == 'br':
+            return self.compressor.flush()
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.coding == 'br':
+            return self.compressor.finish()
+        return self.compressor.flush()
+
+    def whole(self, data):
+        return self.compress(data) + self.finish()
+
+    def _feed(self, chunk):
+        # Flushing after every small chunk (an NDJSON line) would ruin the
+        # ratio, so output is forced out only every FLUSH_EVERY input bytes.
+        data = self.compress(chunk)
+        self.pending += len(chunk)
+        if self.pending >= FLUSH_EVERY:
+            self.pending = 0
+            data += self.flush()
+        return data
+
+    def stream(self, chunks):
+        self.pending = 0
+        for chunk in chunks:
+            data = self._feed(chunk)
+            if data:
+                yield data
+        yield self.finish()
+
+    async def astream(self, chunks):
+        self.pending = 0
+        async for chunk in chunks:
+            data = self._feed(chunk)
+            if data:
+                yield data
+        yield self.finish()
@@ -0,0 +1,115 @@
+import os
+import socket
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Order
+
+
+"""
+    A work queue over the orders table: workers claim batches of submitted
+    orders with one conditional UPDATE, so parallel workers never get the
+    same order, and mark them sent with another. A claim left by a worker
+    that died is taken over once it is older than the lease.
+"""
+
+
+def worker_name():
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+class DispatchQueue:
+
+    def __init__(self, worker=None, lease=None, using=DEFAULT_DB_ALIAS):
+        self.worker = worker or worker_name()
+        self.lease = settings.MARKET_DISPATCH_LEASE if lease is None else lease
+        self.using = using
+
+    def pending(self):
+        return Order.objects.using(self.using).filter(status=Order.STATUS_SUBMITTED)
+
+    def claimable(self, now):
+        return self.pending().filter(
+            Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - timedelta(seconds=self.lease)),
+        )
+
+    def depth(self):
+        return self.pending().count()
+
+    def render(self):
+        # Queue gauges in the Prometheus text format, for the metrics view.
+        claimed = self.pending().filter(claimed_at__isnull=False).count()
+        return '\n'.join([
+            '# HELP market_dispatch_queue_depth Submitted orders not sent yet.',
+            '# TYPE market_dispatch_queue_depth gauge',
+            'market_dispatch_queue_depth {}'.format(self.depth()),
+            '# HELP market_dispatch_claimed Submitted orders held by a dispatch worker.',
+            '# TYPE market_dispatch_claimed gauge',
+            'market_dispatch_claimed {}'.format(claimed),
+        ]) + '\n'
+
+    def claim(self, limit):
+        # Returns the ids of up to `limit` orders now held by this worker.
+        now = timezone.now()
+        features = connections[self.using].features
+        with transaction.atomic(using=self.using):
+            candidates = self.claimable(now).order_by('id')
+            if features.has_select_for_update_skip_locked:
+                candidates = candidates.select_for_update(skip_locked=True)
+            if features.allow_sliced_subqueries_with_in:
+                candidates = candidates.values('id')[:limit]
+            else:
+                candidates = list(candidates.values_list('id', flat=True)[:limit])
+            # The claim condition is checked again by the UPDATE itself, so a
+            # concurrent claimer that got there first simply wins those rows.
+            claimed = self.claimable(now).filter(id__in=candidates).update(claimed_by=self.worker, claimed_at=now)
+        if not claimed:
+            return []
+        return list(self.pending().filter(
+            claimed_by=self.worker, claimed_at=now,
+        ).order_by('id').values_list('id', flat=True))
+
+    def complete(self, ids):
+        # Marks claimed orders sent; orders canceled meanwhile are skipped.
+        return self.pending().filter(id__in=ids, claimed_by=self.worker).update(
+            status=Order.STATUS_SENT, claimed_by=None, claimed_at=None,
+        )
+
+    def release(self, ids):
+        return self.pending().filter(id__in=ids, claimed_by=self.worker).update(claimed_by=None, claimed_at=None)
+
+    def report(self):
+        return {'worker': self.worker, 'batches': 0, 'claimed': 0, 'sent': 0, 'seconds': 0}
+
+    def drain(self, batch_size, handle=None, max_batches=None, report=None):
+        # Claims and completes batches until the queue is empty. `handle`
+        # gets each batch of ids before they are marked sent; if it raises,
+        # the batch is released for another worker. Counts are added to
+        # `report` as batches finish, so a caller keeps them if one fails.
+        if report is None:
+            report = self.report()
+        batches = 0
+        started = time.perf_counter()
+        try:
+            while max_batches is None or batches < max_batches:
+                ids = self.claim(batch_size)
+                if not ids:
+                    break
+                batches += 1
+                report['batches'] += 1
+                report['claimed'] += len(ids)
+                if handle is not None:
+                    try:
+                        handle(ids)
+                    except Exception:
+                        self.release(ids)
+                        raise
+                report['sent'] += self.complete(ids)
+        finally:
+            report['seconds'] += time.perf_counter() - started
+        return report
@@ -0,0 +1,201 @@
+import codecs
+import csv
+import json
+import re
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, transaction
+
+from .cache import product_cache
+from .models import Product
+
+# What may still follow the part of a number read so far.
+NUMBER_TAIL = re.compile(r'[0-9.eE+-]*\Z')
+
+
+def iter_json_array(stream, chunk_size=64 * 1024):
+    # Yields the items of a top-level JSON array while reading `stream` in
+    # chunks, so only the current item is ever held in memory.
+    decoder = json.JSONDecoder()
+    state = {'buffer': '', 'pos': 0, 'eof': False}
+
+    def fill():
+        chunk = stream.read(chunk_size)
+        state['eof'] = not chunk
+        state['buffer'] = state['buffer'][state['pos']:] + chunk
+        state['pos'] = 0
+
+    def peek():
+        while True:
+            buffer, pos = state['buffer'], state['pos']
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            state['pos'] = pos
+            if pos < len(buffer):
+                return buffer[pos]
+            if state['eof']:
+                return ''
+            fill()
+
+    if peek() != '[':
+        raise ValueError('expected a JSON array.')
+    state['pos'] += 1
+    if peek() == ']':
+        return
+    while True:
+        peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(state['buffer'], state['pos'])
+                # A number cut by the end of the buffer ("1" of "12", "1." of
+                # "1.5") decodes fine but short.
+                if state['eof'] or not NUMBER_TAIL.match(state['buffer'], end):
+                    break
+            except ValueError:
+                if state['eof']:
+                    raise ValueError('malformed JSON array.')
+            fill()
+        state['pos'] = end
+        yield value
+        separator = peek()
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError('malformed JSON array.')
+        state['pos'] += 1
+
+
+def iter_ndjson(stream):
+    # A bad line is yielded as its error so the rest of the file still loads.
+    for line in stream:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield ValueError('malformed JSON line.')
+
+
+def iter_csv(stream):
+    return csv.DictReader(stream)
+
+
+READERS = {
+    'json': iter_json_array,
+    'ndjson': iter_ndjson,
+    'csv': iter_csv,
+}
+
+CONTENT_TYPES = {
+    'application/json': 'json',
+    'application/x-ndjson': 'ndjson',
+    'text/csv': 'csv',
+}
+
+
+def read_records(stream, format, encoding='utf-8'):
+    # `stream` is a binary file-like object: an upload, a request or a file.
+    if format not in READERS:
+        raise ValueError('unknown import format.')
+    return READERS[format](codecs.getreader(encoding)(stream))
+
+
+class ProductImporter:
+    # Upserts products on `code` in batches, each batch in its own
+    # transaction with one lookup, one bulk_create and one bulk_update.
+
+    fields = ['name', 'price', 'inventory']
+
+    def __init__(self, batch_size=1000, max_errors=1000, using=DEFAULT_DB_ALIAS):
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.using = using
+        self.report = {'rows': 0, 'created': 0, 'updated': 0, 'failed': 0, 'errors': []}
+
+    def error(self, row, code, message):
+        self.report['failed'] += 1
+        if len(self.report['errors']) < self.max_errors:
+            self.report['errors'].append({'row': row, 'code': code, 'message': message})
+        else:
+            self.report['errors_truncated'] = True
+
+    @staticmethod
+    def clean(record):
+        if isinstance(record, ValueError):
+            raise record
+        if not isinstance(record, dict):
+            raise ValueError('row is not an object.')
+        missing = [key for key in ('code', 'name', 'price') if record.get(key) in (None, '')]
+        if missing:
+            raise ValueError('missing {}.'.format(', '.join(missing)))
+        inventory = record.get('inventory')
+        product = Product(
+            code=record['code'], name=record['name'], price=record['price'],
+            inventory=0 if inventory in (None, '') else inventory,
+        )
+        try:
+            product.clean_fields()
+        except ValidationError as error:
+            raise ValueError('; '.join(
+                '{}: {}'.format(field, ' '.join(messages)) for field, messages in error.message_dict.items()
+            ))
+        if product.price < 0:
+            raise ValueError('price: Ensure this value is greater than or equal to 0.')
+        return product, inventory not in (None, '')
+
+    def flush(self, batch, last_row):
+        if not batch:
+            return
+        try:
+            self.write(batch)
+        except DatabaseError as error:
+            # The whole batch was rolled back; report it as one error.
+            self.report['failed'] += len(batch) - 1
+            self.error(last_row, None, 'batch of {} rows failed: {}'.format(len(batch), error))
+        batch.clear()
+
+    def write(self, batch):
+        with transaction.atomic(using=self.using):
+            existing = Product.objects.using(self.using).in_bulk(list(batch), field_name='code')
+            created, updated = [], []
+            for code, (product, has_inventory) in batch.items():
+                current = existing.get(code)
+                if current is None:
+                    created.append(product)
+                    continue
+                current.name = product.name
+                current.price = product.price
+                if has_inventory:
+                    current.inventory = product.inventory
+                updated.append(current)
+            if created:
+                Product.objects.using(self.using).bulk_create(created)
+            if updated:
+                Product.objects.using(self.using).bulk_update(updated, self.fields)
+            product_cache.invalidate_on_commit(using=self.using)
+        self.report['created'] += len(created)
+        self.report['updated'] += len(updated)
+
+    def run(self, records):
+        started = time.monotonic()
+        batch = {}
+        try:
+            for row, record in enumerate(records, start=1):
+                self.report['rows'] = row
+                code = record.get('code') if isinstance(record, dict) else None
+                try:
+                    product, has_inventory = self.clean(record)
+                    batch[product.code] = (product, has_inventory)
+                except ValueError as error:
+                    self.error(row, code, error.args[0])
+                    continue
+                if len(batch) >= self.batch_size:
+                    self.flush(batch, row)
+        except ValueError as error:
+            self.error(self.report['rows'] + 1, None, error.args[0])
+        self.flush(batch, self.report['rows'])
+        seconds = time.monotonic() - started
+        self.report['seconds'] = round(seconds, 3)
+        self.report['rows_per_second'] = round(self.report['rows'] / seconds) if seconds else None
+        return self.report
@@ -0,0 +1,22 @@
+"""
+    Telling lock conflicts, which are worth retrying, from other database
+    errors.
+"""
+
+
+# PostgreSQL serialization failure, deadlock and lock_not_available.
+LOCK_SQLSTATES = {'40001', '40P01', '55P03'}
+
+# MySQL lock wait timeout and deadlock.
+LOCK_MYSQL_ERRORS = {1205, 1213}
+
+
+def is_lock_error(error):
+    # `error` is the Django wrapper; the driver's exception is its cause.
+    cause = error.__cause__ or error
+    if getattr(cause, 'pgcode', None) in LOCK_SQLSTATES or getattr(cause, 'sqlstate', None) in LOCK_SQLSTATES:
+        return True
+    if cause.args and cause.args[0] in LOCK_MYSQL_ERRORS:
+        return True
+    # SQLite: "database is locked", "database table is locked".
+    return 'locked' in str(cause)
@@ -0,0 +1,50 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from market.benchmarking import measure, test_database
+from market.models import Customer
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares cookie-session and bearer-token authentication on a throwaway test database: '
+        'the cost of logging in and the per-request overhead on an authenticated endpoint, '
+        'reported as JSON latency percentiles and queries per request.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/market/shopping/cart/', help='Authenticated GET endpoint.')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per scheme.')
+        parser.add_argument('--logins', type=int, default=20, help='Logins and token requests timed.')
+
+    def handle(self, *args, **options):
+        credentials = json.dumps({'username': 'bench', 'password': 'bench-password'})
+        with test_database():
+            user = User.objects.create_user('bench', password='bench-password')
+            Customer.objects.create(user=user, phone='0', address='bench')
+            session, token = Client(), Client()
+
+            def log_in():
+                session.post('/market/customer/login/', credentials, content_type='application/json')
+
+            tokens = []
+
+            def obtain_token():
+                response = token.post('/market/customer/token/', credentials, content_type='application/json')
+                tokens.append(response.json()['token'])
+
+            results = {
+                'login': {
+                    'session': measure(log_in, options['logins']),
+                    'token': measure(obtain_token, options['logins']),
+                },
+            }
+            authorization = 'Bearer ' + tokens[-1]
+            results['request'] = {
+                'session': measure(lambda: session.get(options['path']), options['requests']),
+                'token': measure(lambda: token.get(options['path'], HTTP_AUTHORIZATION=authorization), options['requests']),
+            }
+        self.stdout.write(json.dumps(results, indent=2))
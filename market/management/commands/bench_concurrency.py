@@ -0,0 +1,81 @@
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from market.benchmarking import summarize
+
+
+DEFAULT_PATHS = [
+    '/market/product/list/?limit=50',
+    '/market/product/1/',
+    '/market/customer/list/?limit=50',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Drives running deployments (for example manage.py runserver or gunicorn for WSGI and '
+        'uvicorn supermarket.asgi:application for ASGI) at increasing concurrency and reports '
+        'throughput and latency percentiles per level as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target', action='append', required=True, metavar='NAME=URL',
+            help='Deployment to measure, e.g. wsgi=http://127.0.0.1:8000; may be repeated.',
+        )
+        parser.add_argument('--path', action='append', help='Request path; may be repeated.')
+        parser.add_argument('--concurrency', default='1,8,32,128', help='Comma separated client counts.')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per concurrency level.')
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        paths = options['path'] or DEFAULT_PATHS
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        results = {}
+        for target in options['target']:
+            name, _, url = target.partition('=')
+            if not url:
+                raise CommandError('--target must look like NAME=URL.')
+            results[name] = [
+                self.run_level(urlsplit(url), paths, level, options['requests'], options['timeout'])
+                for level in levels
+            ]
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def run_level(self, url, paths, concurrency, total, timeout):
+        latencies, errors = [], []
+        lock = threading.Lock()
+        counter = iter(range(total))
+
+        def client():
+            connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=timeout)
+            while True:
+                with lock:
+                    index = next(counter, None)
+                if index is None:
+                    break
+                started = time.perf_counter()
+                try:
+                    connection.request('GET', paths[index % len(paths)])
+                    response = connection.getresponse()
+                    response.read()
+                    failed = response.status >= 500
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    failed = True
+                with lock:
+                    (errors if failed else latencies).append(time.perf_counter() - started)
+            connection.close()
+
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return summarize(latencies, time.perf_counter() - started, concurrency=concurrency, errors=len(errors))
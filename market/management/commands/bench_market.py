@@ -0,0 +1,190 @@
+import http.client
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from market.benchmarking import BENCH_PASSWORD, live_server, seed_dataset, summarize, test_database
+from market.metrics import registry
+from market.models import Customer, Order, Product
+from market.tokens import issue_token
+
+
+class ClientDriver:
+    # Requests through django.test.Client, queries counted on the connection.
+
+    def __init__(self):
+        self.client = Client()
+
+    def request(self, method, path, body=None, headers=None):
+        extra = {'HTTP_' + name.upper().replace('-', '_'): value for name, value in (headers or {}).items()}
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as queries:
+            response = self.client.generic(method, path, body or '', content_type='application/json', **extra)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        return response.status_code, len(queries)
+
+
+class HTTPDriver:
+    # Requests over HTTP to the in-process live server, one connection each
+    # (the development server's keep-alive adds delayed-ACK stalls); queries
+    # come from the metrics middleware's totals.
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+
+    def request(self, method, path, body=None, headers=None):
+        before = registry.totals()
+        headers = dict(headers or {}, **{'Content-Type': 'application/json'})
+        connection = http.client.HTTPConnection(self.host, self.port)
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        connection.close()
+        after = registry.totals()
+        queries = after[1] - before[1] if after[0] > before[0] else None
+        return response.status, queries
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a throwaway test database with a synthetic dataset, drives every market route '
+        'through the test client (or an in-process live server with --live) and prints latency '
+        'percentiles, throughput and queries per request as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--customers', type=int, default=200)
+        parser.add_argument('--orders', type=int, default=2000, help='Historical orders.')
+        parser.add_argument('--rows-per-order', type=int, default=3)
+        parser.add_argument('--requests', type=int, default=100, help='Requests per route.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the dataset.')
+        parser.add_argument('--live', action='store_true', help='Use a live server instead of the test client.')
+        parser.add_argument('--route', action='append', help='Only run this route; may be repeated.')
+
+    def handle(self, *args, **options):
+        if options['products'] < 10 or options['customers'] < 2:
+            raise CommandError('need at least 10 products and 2 customers.')
+        with test_database():
+            dataset = seed_dataset(
+                options['products'], options['customers'], options['orders'],
+                options['rows_per_order'], options['seed'],
+            )
+            if options['live']:
+                with live_server() as server:
+                    routes = self.run_routes(HTTPDriver(server.host, server.port), options)
+            else:
+                routes = self.run_routes(ClientDriver(), options)
+        self.stdout.write(json.dumps({
+            'dataset': dataset, 'driver': 'live' if options['live'] else 'client', 'routes': routes,
+        }, indent=2, sort_keys=True))
+
+    def run_routes(self, driver, options):
+        results = {}
+        for name, scenario in self.scenarios(options).items():
+            if options['route'] and name not in options['route']:
+                continue
+            # Routes that hash a password are far slower; run fewer of them.
+            count = max(1, options['requests'] // 10) if scenario.get('hashes') else options['requests']
+            latencies, statuses, queries = [], {}, []
+            started = time.perf_counter()
+            for i in range(count):
+                if 'prepare' in scenario:
+                    scenario['prepare'](i)
+                method, path, body, headers = scenario['request'](i)
+                began = time.perf_counter()
+                status, count_queries = driver.request(method, path, body, headers)
+                latencies.append(time.perf_counter() - began)
+                statuses[status] = statuses.get(status, 0) + 1
+                if count_queries is not None:
+                    queries.append(count_queries)
+            results[name] = summarize(
+                latencies, time.perf_counter() - started,
+                statuses={str(status): number for status, number in sorted(statuses.items())},
+                queries_per_request=round(sum(queries) / len(queries), 2) if queries else None,
+            )
+        return results
+
+    def scenarios(self, options):
+        products = list(Product.objects.order_by('pk').values_list('pk', 'code', 'name'))
+        customers = list(Customer.objects.order_by('pk').values_list('pk', 'user_id'))
+        users = User.objects.in_bulk([user_id for _, user_id in customers])
+        tokens = {}
+
+        def auth(index):
+            # Bearer header for the index-th customer.
+            customer_id, user_id = customers[index % len(customers)]
+            if customer_id not in tokens:
+                tokens[customer_id] = 'Bearer ' + issue_token(users[user_id], customer_id)['token']
+            return {'Authorization': tokens[customer_id]}
+
+        def product(i):
+            return products[i % len(products)]
+
+        def customer(i):
+            return customers[i % len(customers)][0]
+
+        def credentials(i):
+            return json.dumps({'username': users[customers[i % len(customers)][1]].username, 'password': BENCH_PASSWORD})
+
+        def fill_cart(i):
+            # Submitting customers are 1..n; customer 0 owns the browsing cart.
+            customer_id = customers[1 + i % (len(customers) - 1)][0]
+            order = Order.objects.filter(customer_id=customer_id, status=Order.STATUS_SHOPPING).first()
+            if order is None:
+                order = Order.initiate(customer=customer_id)
+            order.add_products([{'code': product(i + n)[1], 'amount': 1} for n in range(3)])
+
+        def cart_items(i):
+            return json.dumps([{'code': product(i)[1], 'amount': 1}])
+
+        def get(path, authorized=False):
+            return lambda i: ('GET', path(i) if callable(path) else path, None, auth(0) if authorized else None)
+
+        def post(path, body, headers=None):
+            return lambda i: ('POST', path(i) if callable(path) else path, body(i), headers(i) if headers else None)
+
+        keyword = products[0][2].split()[1]
+        return {
+            'product_detail': {'request': get(lambda i: '/market/product/{}/'.format(product(i)[0]))},
+            'product_list': {'request': get('/market/product/list/')},
+            'product_page': {'request': get('/market/product/list/?limit=50')},
+            'product_search': {'request': get('/market/product/list/?search=' + keyword)},
+            'product_stream': {'request': get('/market/product/list/?format=ndjson')},
+            'product_insert': {'request': post('/market/product/insert/', lambda i: json.dumps(
+                {'code': 'n{:06d}'.format(i), 'name': 'new product {}'.format(i), 'price': 10, 'inventory': 10}))},
+            'product_import': {'request': post('/market/product/import/', lambda i: json.dumps([
+                {'code': product(i * 10 + n)[1], 'name': product(i * 10 + n)[2], 'price': 20} for n in range(10)]))},
+            'product_edit': {'request': post(
+                lambda i: '/market/product/{}/edit_inventory/'.format(product(i)[0]), lambda i: json.dumps({'amount': 1}))},
+            'inventory_edit': {'request': post('/market/product/inventory/', lambda i: json.dumps(
+                {product(i * 10 + n)[1]: 1 for n in range(10)}))},
+            'customer_detail': {'request': get(lambda i: '/market/customer/{}/'.format(customer(i)))},
+            'customer_list': {'request': get('/market/customer/list/')},
+            'customer_page': {'request': get('/market/customer/list/?limit=50')},
+            'customer_search': {'request': get('/market/customer/list/?search=street')},
+            'customer_stream': {'request': get('/market/customer/list/?format=ndjson')},
+            'customer_edit': {'request': post(
+                lambda i: '/market/customer/{}/edit/'.format(customer(i)), lambda i: json.dumps({'address': 'edited {}'.format(i)}))},
+            'customer_register': {'hashes': True, 'request': post('/market/customer/register/', lambda i: json.dumps({
+                'username': 'new{:06d}'.format(i), 'password': BENCH_PASSWORD, 'phone': '1', 'address': 'new street'}))},
+            'customer_profile': {'request': get('/market/customer/profile/', authorized=True)},
+            'log_in': {'hashes': True, 'request': post('/market/customer/login/', credentials)},
+            'token_obtain': {'hashes': True, 'request': post('/market/customer/token/', credentials)},
+            'log_out': {'request': lambda i: ('POST', '/market/customer/logout/', None, {
+                'Authorization': 'Bearer ' + issue_token(users[customers[0][1]], customers[0][0])['token']})},
+            'cart_show': {'request': get('/market/shopping/cart/', authorized=True)},
+            'add_items': {'request': post('/market/shopping/cart/add_items/', cart_items, lambda i: auth(0))},
+            'remove_items': {'request': post('/market/shopping/cart/remove_items/', cart_items, lambda i: auth(0))},
+            'submit': {'prepare': fill_cart, 'request': lambda i: ('POST', '/market/shopping/submit/', None, auth(1 + i % (len(customers) - 1)))},
+            'order_history': {'request': get('/market/shopping/orders/?limit=20', authorized=True)},
+            'sales_products': {'request': get('/market/sales/products/?start=2000-01-01&end=2100-01-01')},
+            'sales_daily': {'request': get('/market/sales/daily/?start=2000-01-01&end=2100-01-01')},
+            'sales_customers': {'request': get('/market/sales/customers/?start=2000-01-01&end=2100-01-01')},
+            'metrics': {'request': get('/metrics')},
+        }
@@ -0,0 +1,82 @@
+import json
+import multiprocessing
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+from market.dispatch import DispatchQueue
+from market.locks import is_lock_error
+
+
+def run_worker(options):
+    # One dispatch process: drains the queue, retrying batches that lose a
+    # lock up to --max-retries times in a row, and with --forever waits for
+    # new orders instead of exiting.
+    connections.close_all()
+    queue = DispatchQueue(lease=options['lease'], using=options['database'])
+    totals = dict(queue.report(), lock_retries=0)
+    retries = 0
+    while True:
+        try:
+            queue.drain(options['batch_size'], max_batches=options['max_batches'], report=totals)
+        except OperationalError as error:
+            if not is_lock_error(error) or retries >= options['max_retries']:
+                raise
+            retries += 1
+            totals['lock_retries'] += 1
+            time.sleep(random.uniform(0, 0.01 * 2 ** min(retries, 6)))
+            continue
+        retries = 0
+        if not options['forever']:
+            break
+        time.sleep(options['idle_sleep'])
+    connections.close_all()
+    return totals
+
+
+class Command(BaseCommand):
+    help = (
+        'Marks submitted orders sent in batches claimed from the orders table, from one or more '
+        'processes (and as many hosts as you like) without double-claiming, then reports throughput '
+        'and queue depth as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--batch-size', type=int, default=500, help='Orders claimed per batch.')
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes to fork.')
+        parser.add_argument('--lease', type=int, help='Seconds before an abandoned claim is taken over.')
+        parser.add_argument('--max-batches', type=int, help='Stop each worker after this many batches.')
+        parser.add_argument('--forever', action='store_true', help='Keep polling once the queue is empty.')
+        parser.add_argument('--max-retries', type=int, default=20, help='Lock conflicts retried in a row before giving up.')
+        parser.add_argument('--idle-sleep', type=float, default=5, help='Seconds between polls with --forever.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['processes'] < 1:
+            raise CommandError('--batch-size and --processes must be positive.')
+        queue = DispatchQueue(using=options['database'])
+        depth = queue.depth()
+        started = time.perf_counter()
+        if options['processes'] == 1:
+            workers = [run_worker(options)]
+        else:
+            if 'fork' not in multiprocessing.get_all_start_methods():
+                raise CommandError('--processes needs the fork start method; run several commands instead.')
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(options['processes']) as pool:
+                workers = pool.map(run_worker, [options] * options['processes'])
+        elapsed = time.perf_counter() - started
+        sent = sum(worker['sent'] for worker in workers)
+        for worker in workers:
+            worker['seconds'] = round(worker['seconds'], 3)
+        self.stdout.write(json.dumps({
+            'queue_depth_before': depth,
+            'queue_depth_after': queue.depth(),
+            'sent': sent,
+            'claimed': sum(worker['claimed'] for worker in workers),
+            'seconds': round(elapsed, 3),
+            'orders_per_second': round(sent / elapsed, 1) if elapsed else None,
+            'workers': workers,
+        }, indent=2))
@@ -0,0 +1,30 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from market.importer import READERS, ProductImporter, read_records
+
+
+class Command(BaseCommand):
+    help = 'Upserts products on their code from a JSON array, NDJSON or CSV file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin.")
+        parser.add_argument('--format', choices=sorted(READERS), help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if format not in READERS:
+            raise CommandError('Cannot guess the format of {}, use --format.'.format(path))
+        importer = ProductImporter(batch_size=options['batch_size'], using=options['database'])
+        if path == '-':
+            report = importer.run(read_records(sys.stdin.buffer, format))
+        else:
+            with open(path, 'rb') as stream:
+                report = importer.run(read_records(stream, format))
+        self.stdout.write(json.dumps(report, indent=2))
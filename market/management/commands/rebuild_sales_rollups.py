@@ -0,0 +1,62 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from market.models import CustomerDailySales, Order, ProductDailySales, sales_day
+
+# Orders whose sales count: submitted, and submitted then sent.
+SOLD = [Order.STATUS_SUBMITTED, Order.STATUS_SENT]
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds the daily product and customer sales rollups from order history, '
+        'a chunk of days per transaction.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--start', help='First day (YYYY-MM-DD); defaults to the first order.')
+        parser.add_argument('--end', help='Last day (YYYY-MM-DD); defaults to the last order.')
+        parser.add_argument('--days', type=int, default=31, help='Days rebuilt per transaction.')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        orders = Order.objects.using(using).filter(status__in=SOLD)
+        bounds = orders.aggregate(first=Min('submitted_at'), last=Max('submitted_at'))
+        if bounds['first'] is None and not (options['start'] and options['end']):
+            self.stdout.write('no sales to roll up.')
+            return
+        start = self.day(options['start']) or sales_day(bounds['first'])
+        end = self.day(options['end']) or sales_day(bounds['last'])
+        step = datetime.timedelta(days=options['days'])
+        products = customers = 0
+        while start <= end:
+            last = min(start + step - datetime.timedelta(days=1), end)
+            chunk = orders.filter(
+                submitted_at__gte=self.midnight(start), submitted_at__lt=self.midnight(last + datetime.timedelta(days=1)),
+            )
+            with transaction.atomic(using=using):
+                products += len(ProductDailySales.objects.db_manager(using).rebuild(start, last, ProductDailySales.history(chunk)))
+                customers += len(CustomerDailySales.objects.db_manager(using).rebuild(start, last, CustomerDailySales.history(chunk)))
+            start = last + datetime.timedelta(days=1)
+        self.stdout.write('{} product and {} customer rollup rows written.'.format(products, customers))
+
+    @staticmethod
+    def day(value):
+        if value is None:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError('dates must look like YYYY-MM-DD.')
+        return day
+
+    @staticmethod
+    def midnight(day):
+        moment = datetime.datetime.combine(day, datetime.time())
+        return timezone.make_aware(moment) if settings.USE_TZ else moment
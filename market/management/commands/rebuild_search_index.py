@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from market import search
+from market.models import Customer
+
+
+class Command(BaseCommand):
+    help = 'Refreshes customer search documents and rebuilds the market search indexes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        using = options['database']
+        Customer.refresh_search_documents(Customer.objects.using(using))
+        backend = search.get_backend(using)
+        for index in search.INDEXES:
+            backend.install(connections[using], index)
+            backend.rebuild(connections[using], index)
+            self.stdout.write('{} index rebuilt with {}.'.format(index.name, type(backend).__name__))
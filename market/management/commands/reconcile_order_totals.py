@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from market.models import Order, OrderRow
+
+
+class Command(BaseCommand):
+    help = 'Recomputes Order.total_price from the order rows and fixes the orders that drifted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--status', type=int, action='append',
+            help='Order status to reconcile, may be repeated. Defaults to shopping orders only.',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true', help='Only count the drifted orders.')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        statuses = options['status'] or [Order.STATUS_SHOPPING]
+        rows_total = Coalesce(Subquery(
+            OrderRow.objects.using(using).filter(order=OuterRef('pk')).values('order').annotate(
+                total=Sum(F('amount') * F('unit_price'), output_field=models.IntegerField()),
+            ).values('total')
+        ), 0)
+        orders = Order.objects.using(using).filter(status__in=statuses)
+        last_pk, checked, fixed = 0, 0, 0
+        while True:
+            pks = list(orders.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:options['batch_size']])
+            if not pks:
+                break
+            last_pk = pks[-1]
+            checked += len(pks)
+            with transaction.atomic(using=using):
+                drifted = orders.filter(pk__in=pks).annotate(rows_total=rows_total).exclude(total_price=F('rows_total'))
+                if options['dry_run']:
+                    fixed += drifted.count()
+                else:
+                    fixed += Order.objects.using(using).filter(
+                        pk__in=list(drifted.values_list('pk', flat=True)),
+                    ).update(total_price=rows_total)
+        self.stdout.write('{} orders checked, {} {}.'.format(
+            checked, fixed, 'drifted' if options['dry_run'] else 'fixed',
+        ))
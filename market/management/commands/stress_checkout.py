@@ -0,0 +1,234 @@
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.db.models import F, IntegerField, Sum
+from django.db.models.functions import Coalesce
+
+from market.benchmarking import seed_dataset, summarize, test_database
+from market.locks import is_lock_error
+from market.models import Customer, Order, OrderRow, Product
+
+
+class Retrying:
+    # Runs database calls again when they fail on a lock (see
+    # market.locks.is_lock_error), keeping count of retries and the time
+    # lost to them; other database errors are raised at once.
+
+    def __init__(self, attempts, rng):
+        self.attempts = attempts
+        self.rng = rng
+        self.retries = 0
+        self.lock_wait = 0
+        self.gave_up = 0
+
+    def __call__(self, func, *args):
+        for attempt in range(self.attempts):
+            started = time.perf_counter()
+            try:
+                return func(*args)
+            except OperationalError as error:
+                if not is_lock_error(error):
+                    raise
+                self.lock_wait += time.perf_counter() - started
+                if attempt == self.attempts - 1:
+                    self.gave_up += 1
+                    raise
+                self.retries += 1
+                time.sleep(self.rng.uniform(0, 0.01 * 2 ** min(attempt, 6)))
+
+    def stats(self):
+        return {'retries': self.retries, 'gave_up': self.gave_up, 'lock_wait_seconds': self.lock_wait}
+
+
+def checkout_worker(task):
+    # Fills and submits one cart per customer through the same model calls
+    # the add_items and submit views make.
+    customer_ids, hot_codes, codes, items, seed, attempts = task
+    connections.close_all()
+    rng = random.Random(seed)
+    retrying = Retrying(attempts, rng)
+    latencies, outcomes, rejected_items = [], {}, 0
+    for customer_id in customer_ids:
+        cart = [{'code': code, 'amount': rng.randint(1, 2)} for code in rng.sample(hot_codes, min(2, len(hot_codes)))]
+        cart += [{'code': code, 'amount': rng.randint(1, 3)} for code in rng.sample(codes, items)]
+        started = time.perf_counter()
+        try:
+            order = retrying(Order.initiate, customer_id)
+            rejected_items += len(retrying(order.add_products, cart))
+            retrying(order.submit)
+            outcome = 'submitted'
+        except ValueError as error:
+            outcome = error.args[0]
+        except OperationalError:
+            outcome = 'gave up on lock.'
+        latencies.append(time.perf_counter() - started)
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    connections.close_all()
+    return {
+        'kind': 'checkout', 'latencies': latencies, 'outcomes': outcomes,
+        'rejected_items': rejected_items, 'retry': retrying.stats(),
+    }
+
+
+def edit_worker(task):
+    # Moves hot-SKU inventory up and down the way product_edit does.
+    hot_codes, edits, seed, attempts = task
+    connections.close_all()
+    rng = random.Random(seed)
+    retrying = Retrying(attempts, rng)
+    applied, outcomes = {}, {}
+    for _ in range(edits):
+        code = rng.choice(hot_codes)
+        amount = rng.choice([-2, -1, 1, 2])
+
+        def edit():
+            product = Product.objects.get(code=code)
+            if amount < 0:
+                product.decrease_inventory(amount=-amount)
+            else:
+                product.increase_inventory(amount=amount)
+        try:
+            retrying(edit)
+            applied[code] = applied.get(code, 0) + amount
+            outcome = 'applied'
+        except ValueError as error:
+            outcome = error.args[0]
+        except OperationalError:
+            outcome = 'gave up on lock.'
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    connections.close_all()
+    return {'kind': 'edit', 'applied': applied, 'outcomes': outcomes, 'retry': retrying.stats()}
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs concurrent checkouts and inventory edits against hot SKUs from several processes '
+        'on a throwaway database (a SQLite file when the project uses SQLite), reports checkout '
+        'throughput, latency and lock retries, then checks that no inventory went negative, that '
+        'stock and balances reconcile with submitted orders and that order totals match their rows.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Checkout processes.')
+        parser.add_argument('--editors', type=int, default=2, help='Inventory editing processes.')
+        parser.add_argument('--carts', type=int, default=400, help='Carts submitted in total.')
+        parser.add_argument('--products', type=int, default=200)
+        parser.add_argument('--hot-skus', type=int, default=5, help='Products every cart competes for.')
+        parser.add_argument('--hot-inventory', type=int, default=100, help='Starting stock of each hot SKU.')
+        parser.add_argument('--items', type=int, default=3, help='Other products per cart.')
+        parser.add_argument('--edits', type=int, default=200, help='Inventory edits per editor.')
+        parser.add_argument('--balance', type=int, default=5000, help='Starting balance of each customer.')
+        parser.add_argument('--attempts', type=int, default=20, help='Tries per call before giving up on a lock.')
+        parser.add_argument('--wal', action='store_true', help='Put the SQLite database in WAL mode.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError('stress_checkout needs the fork start method.')
+        if options['products'] < options['hot_skus'] + options['items']:
+            raise CommandError('--products must exceed --hot-skus plus --items.')
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            # Other backends get their usual test database, which every
+            # process reaches through the server.
+            with test_database() as connection:
+                report = self.run(connection, options)
+        else:
+            # An in-memory SQLite database cannot be shared between processes.
+            directory = tempfile.mkdtemp(prefix='market-stress-')
+            name = os.path.join(directory, 'stress.sqlite3')
+            try:
+                with test_database(name=name) as connection:
+                    report = self.run(connection, options)
+            finally:
+                if os.path.exists(name):
+                    os.remove(name)
+                os.rmdir(directory)
+        self.stdout.write(json.dumps(report, indent=2, sort_keys=True))
+        if report['violations']:
+            raise CommandError('invariants violated.')
+
+    def run(self, connection, options):
+        if options['wal'] and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode=WAL')
+        seed_dataset(options['products'], options['carts'], 0, seed=options['seed'])
+        codes = list(Product.objects.order_by('pk').values_list('code', flat=True))
+        hot_codes, codes = codes[:options['hot_skus']], codes[options['hot_skus']:]
+        Product.objects.filter(code__in=hot_codes).update(inventory=options['hot_inventory'])
+        Customer.objects.update(balance=options['balance'])
+        inventory = dict(Product.objects.values_list('id', 'inventory'))
+        balances = dict(Customer.objects.values_list('id', 'balance'))
+        customer_ids = sorted(balances)
+
+        rng = random.Random(options['seed'])
+        tasks = [
+            (checkout_worker, (customer_ids[n::options['workers']], hot_codes, codes, options['items'],
+                               rng.random(), options['attempts']))
+            for n in range(options['workers'])
+        ] + [
+            (edit_worker, (hot_codes, options['edits'], rng.random(), options['attempts']))
+            for n in range(options['editors'])
+        ]
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        started = time.perf_counter()
+        with context.Pool(len(tasks)) as pool:
+            results = [pool.apply_async(func, (task,)) for func, task in tasks]
+            results = [result.get() for result in results]
+        elapsed = time.perf_counter() - started
+
+        report = {'database': connection.vendor, 'seconds': round(elapsed, 3), 'checkout': {}, 'edit': {}}
+        for kind in ('checkout', 'edit'):
+            merged = {'outcomes': {}, 'retries': 0, 'gave_up': 0, 'lock_wait_seconds': 0}
+            for result in results:
+                if result['kind'] == kind:
+                    for outcome, count in result['outcomes'].items():
+                        merged['outcomes'][outcome] = merged['outcomes'].get(outcome, 0) + count
+                    for key, value in result['retry'].items():
+                        merged[key] += value
+            merged['lock_wait_seconds'] = round(merged['lock_wait_seconds'], 3)
+            report[kind] = merged
+        latencies = [latency for result in results if result['kind'] == 'checkout' for latency in result['latencies']]
+        report['checkout'].update(summarize(latencies, elapsed))
+        # Cart lines add_products turned away, mostly hot SKUs out of stock.
+        report['checkout']['rejected_items'] = sum(result.get('rejected_items', 0) for result in results)
+        report['checkout']['submitted_per_second'] = round(
+            report['checkout']['outcomes'].get('submitted', 0) / elapsed, 1)
+        edited = {}
+        for result in results:
+            for code, amount in result.get('applied', {}).items():
+                edited[code] = edited.get(code, 0) + amount
+        report['violations'] = self.verify(inventory, balances, edited)
+        return report
+
+    def verify(self, inventory, balances, edited):
+        violations = []
+        for pk, code, level in Product.objects.filter(inventory__lt=0).values_list('pk', 'code', 'inventory'):
+            violations.append({'check': 'negative inventory', 'product': code, 'inventory': level})
+
+        sold = dict(OrderRow.objects.filter(order__status=Order.STATUS_SUBMITTED).values_list(
+            'product_id').annotate(total=Sum('amount')).values_list('product_id', 'total'))
+        for pk, code, level in Product.objects.values_list('pk', 'code', 'inventory'):
+            expected = inventory[pk] + edited.get(code, 0) - sold.get(pk, 0)
+            if level != expected:
+                violations.append({'check': 'inventory', 'product': code, 'expected': expected, 'actual': level})
+
+        spent = dict(Order.objects.filter(status=Order.STATUS_SUBMITTED).values_list(
+            'customer_id').annotate(total=Sum('total_price')).values_list('customer_id', 'total'))
+        for pk, balance in Customer.objects.values_list('pk', 'balance'):
+            expected = balances[pk] - spent.get(pk, 0)
+            if balance != expected:
+                violations.append({'check': 'balance', 'customer': pk, 'expected': expected, 'actual': balance})
+
+        mismatched = Order.objects.annotate(rows_total=Coalesce(
+            Sum(F('rows__amount') * F('rows__unit_price'), output_field=IntegerField()), 0,
+        )).exclude(total_price=F('rows_total')).values_list('pk', 'total_price', 'rows_total')
+        for pk, total_price, rows_total in mismatched:
+            violations.append({'check': 'order total', 'order': pk, 'total_price': total_price, 'rows_total': rows_total})
+        return violations
@@ -0,0 +1,124 @@
+import datetime
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.utils import timezone
+
+from market.locks import is_lock_error
+from market.models import Order, OrderRow
+from market.serializers import ndjson_line
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes shopping carts idle for longer than MARKET_CART_TTL, with their rows, a small '
+        'chunk per transaction with a pause in between, and reports what it reclaimed as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--ttl', type=int, help='Seconds a cart may stay idle; defaults to MARKET_CART_TTL.')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Carts deleted per transaction.')
+        parser.add_argument('--sleep', type=float, default=0.05, help='Seconds to pause between chunks.')
+        parser.add_argument('--max-retries', type=int, default=20, help='Lock conflicts retried in a row before giving up.')
+        parser.add_argument('--max-chunks', type=int, help='Stop after this many chunks.')
+        parser.add_argument('--archive', help='Append the deleted carts to this file as NDJSON first.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the idle carts.')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive.')
+        using = options['database']
+        ttl = settings.MARKET_CART_TTL if options['ttl'] is None else options['ttl']
+        cutoff = timezone.now() - datetime.timedelta(seconds=ttl)
+        idle = Order.objects.using(using).filter(status=Order.STATUS_SHOPPING, last_activity__lt=cutoff)
+        report = {'cutoff': cutoff.isoformat(), 'idle_carts': idle.count()}
+        if options['dry_run']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        archive = open(options['archive'], 'ab') if options['archive'] else None
+        free_before = self.free_bytes(using)
+        report.update(chunks=0, carts=0, rows=0, lock_retries=0)
+        retries = 0
+        started = time.perf_counter()
+        try:
+            while options['max_chunks'] is None or report['chunks'] < options['max_chunks']:
+                try:
+                    swept = self.sweep_chunk(idle, options['chunk_size'], archive)
+                except OperationalError as error:
+                    # Lost a lock to a shopper; back off and take the chunk again.
+                    if not is_lock_error(error) or retries >= options['max_retries']:
+                        raise
+                    retries += 1
+                    report['lock_retries'] += 1
+                    time.sleep(max(options['sleep'], 0.01 * 2 ** min(retries, 6)))
+                    continue
+                retries = 0
+                if swept is None:
+                    break
+                carts, rows = swept
+                report['chunks'] += 1
+                report['carts'] += carts
+                report['rows'] += rows
+                time.sleep(options['sleep'])
+        finally:
+            if archive is not None:
+                archive.close()
+        report['seconds'] = round(time.perf_counter() - started, 3)
+        free_after = self.free_bytes(using)
+        report['freed_bytes'] = None if free_before is None else free_after - free_before
+        self.stdout.write(json.dumps(report, indent=2))
+
+    @staticmethod
+    def sweep_chunk(idle, limit, archive=None):
+        # Deletes up to `limit` idle carts in one short transaction; None when
+        # there are none left. Carts a shopper is using (locked by
+        # _apply_items) are skipped where the backend supports it. The carts
+        # are written to `archive` before they are deleted, so a chunk that
+        # fails or is retried may be archived twice but is never lost.
+        using = idle.db
+        with transaction.atomic(using=using):
+            candidates = idle.order_by('last_activity')
+            if connections[using].features.has_select_for_update_skip_locked:
+                candidates = candidates.select_for_update(skip_locked=True)
+            ids = list(candidates.values_list('id', flat=True)[:limit])
+            if not ids:
+                return None
+            # The idle conditions are checked again on every statement, so a
+            # cart touched or submitted since it was selected is never deleted.
+            ids = list(idle.filter(id__in=ids).values_list('id', flat=True))
+            if archive is not None:
+                archived, items = [], {}
+                for order_id, code, amount, unit_price in OrderRow.objects.using(using).filter(
+                        order_id__in=ids).values_list('order_id', 'product_code', 'amount', 'unit_price'):
+                    items.setdefault(order_id, []).append({'code': code, 'amount': amount, 'unit_price': unit_price})
+                for cart in Order.objects.using(using).filter(id__in=ids).values(
+                        'id', 'customer_id', 'total_price', 'order_time', 'last_activity'):
+                    cart['order_time'] = cart['order_time'].isoformat()
+                    cart['last_activity'] = cart['last_activity'].isoformat()
+                    cart['items'] = items.get(cart['id'], [])
+                    archived.append(ndjson_line(cart))
+                archive.writelines(archived)
+                archive.flush()
+                os.fsync(archive.fileno())
+            rows = OrderRow.objects.using(using).filter(order_id__in=ids).delete()[0]
+            carts = idle.filter(id__in=ids).delete()[0]
+        return carts, rows
+
+    @staticmethod
+    def free_bytes(using):
+        # Bytes on SQLite's freelist: pages the file keeps and reuses for new
+        # rows (VACUUM returns them to the filesystem). Other backends
+        # reclaim space in their own vacuum, so nothing is reported there.
+        connection = connections[using]
+        if connection.vendor != 'sqlite':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA page_size')
+            page_size = cursor.fetchone()[0]
+            cursor.execute('PRAGMA freelist_count')
+            return page_size * cursor.fetchone()[0]
@@ -0,0 +1,53 @@
+import json
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Copies the primary SQLite database into the replica files listed in MARKET_REPLICA_DATABASES '
+        'with the SQLite online backup API, once or every --interval seconds.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('replicas', nargs='*', help='Replica aliases; defaults to MARKET_REPLICAS.')
+        parser.add_argument('--pages', type=int, default=-1, help='Pages copied per step; -1 copies all at once.')
+        parser.add_argument('--interval', type=float, help='Keep copying, this many seconds apart.')
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        replicas = options['replicas'] or settings.MARKET_REPLICAS
+        if primary.vendor != 'sqlite':
+            raise CommandError('sync_replica copies SQLite databases; use the replication of your database server.')
+        if not replicas:
+            raise CommandError('no replicas configured; set MARKET_REPLICA_DATABASES.')
+        unknown = [alias for alias in replicas if alias not in settings.MARKET_REPLICAS]
+        if unknown:
+            raise CommandError('not a replica: {}.'.format(', '.join(unknown)))
+        while True:
+            for alias in replicas:
+                self.stdout.write(json.dumps(self.sync(primary.settings_dict['NAME'], alias, options['pages'])))
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
+
+    @staticmethod
+    def sync(source_name, alias, pages):
+        # The backup is one write transaction on the replica, so its readers
+        # see the old copy or the new one, never a mix.
+        connections[alias].close()
+        started = time.perf_counter()
+        source = sqlite3.connect(source_name)
+        target = sqlite3.connect(connections[alias].settings_dict['NAME'], timeout=30)
+        try:
+            source.backup(target, pages=pages)
+            page_count = target.execute('PRAGMA page_count').fetchone()[0]
+            page_size = target.execute('PRAGMA page_size').fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+        return {'replica': alias, 'bytes': page_count * page_size, 'seconds': round(time.perf_counter() - started, 3)}
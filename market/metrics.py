@@ -0,0 +1,161 @@
+import bisect
+import contextlib
+import contextvars
+import functools
+import threading
+import time
+
+from django.db import connections
+
+
+"""
+    In-process request metrics in the Prometheus text format. Each worker
+    process keeps its own numbers; scrape every process (or run one) to see
+    the whole deployment.
+"""
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield '{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound, cumulative)
+        yield '{}_sum{{{}}} {}'.format(name, labels, round(self.sum, 6))
+        yield '{}_count{{{}}} {}'.format(name, labels, cumulative)
+
+
+class ViewMetrics:
+
+    def __init__(self):
+        self.responses = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.query_seconds = 0
+        self.size = Histogram(SIZE_BUCKETS)
+
+
+class Registry:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def record(self, view, method, status, seconds, queries, query_seconds, size):
+        with self.lock:
+            metrics = self.views.get(view)
+            if metrics is None:
+                metrics = self.views[view] = ViewMetrics()
+            key = (method, status)
+            metrics.responses[key] = metrics.responses.get(key, 0) + 1
+            metrics.latency.observe(seconds)
+            metrics.queries.observe(queries)
+            metrics.query_seconds += query_seconds
+            if size is not None:
+                metrics.size.observe(size)
+
+    def totals(self):
+        # (requests, SQL queries) recorded so far across all views.
+        with self.lock:
+            return (
+                sum(sum(metrics.queries.counts) for metrics in self.views.values()),
+                sum(metrics.queries.sum for metrics in self.views.values()),
+            )
+
+    def render(self):
+        with self.lock:
+            views = sorted(self.views.items())
+            lines = [
+                '# HELP market_http_responses_total Responses by view, method and status.',
+                '# TYPE market_http_responses_total counter',
+            ]
+            for view, metrics in views:
+                for (method, status), count in sorted(metrics.responses.items()):
+                    lines.append('market_http_responses_total{{view="{}",method="{}",status="{}"}} {}'.format(
+                        view, method, status, count))
+            for name, kind, help in (
+                ('market_http_request_duration_seconds', 'latency', 'Time spent in the view and middleware below.'),
+                ('market_db_queries_per_request', 'queries', 'SQL queries run by one request.'),
+                ('market_http_response_size_bytes', 'size', 'Response body size; streaming responses are not counted.'),
+            ):
+                lines.append('# HELP {} {}'.format(name, help))
+                lines.append('# TYPE {} histogram'.format(name))
+                for view, metrics in views:
+                    lines.extend(getattr(metrics, kind).lines(name, 'view="{}"'.format(view)))
+            lines.append('# HELP market_db_query_seconds_total Time spent executing SQL.')
+            lines.append('# TYPE market_db_query_seconds_total counter')
+            for view, metrics in views:
+                lines.append('market_db_query_seconds_total{{view="{}"}} {}'.format(view, round(metrics.query_seconds, 6)))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class QueryTimer:
+    # An execute wrapper that counts queries and their time. Queries of one
+    # request can run on several pool threads at once.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.seconds = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            seconds = time.perf_counter() - started
+            with self.lock:
+                self.seconds += seconds
+                self.count += 1
+
+
+_observers = contextvars.ContextVar('market_query_observers', default=())
+
+
+def observe(execute, sql, params, many, context):
+    # Installed on every connection (see market.signals); passes the query
+    # through the execute wrappers observing the current context.
+    for observer in reversed(_observers.get()):
+        execute = functools.partial(observer, execute)
+    return execute(sql, params, many, context)
+
+
+def install_observer(connection):
+    if observe not in connection.execute_wrappers:
+        connection.execute_wrappers.append(observe)
+
+
+@contextlib.contextmanager
+def observe_queries(observer):
+    # Sends every query run in this context to `observer`, on any database
+    # alias and from any thread the context is copied to, like the async
+    # views' pool (see async_views.run_in_pool).
+    for connection in connections.all():
+        install_observer(connection)
+    token = _observers.set(_observers.get() + (observer,))
+    try:
+        yield observer
+    finally:
+        _observers.reset(token)
+
+
+def timed_queries():
+    return observe_queries(QueryTimer())
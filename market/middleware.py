@@ -0,0 +1,277 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import cached_property
+
+from .compression import Compressor, negotiate
+from .metrics import registry, timed_queries
+from .querycheck import logger as querycheck_logger, record_queries
+from .models import Customer, Order
+from .routers import PRIMARY_COOKIE, primary_cache, primary_key
+from .tokens import TokenUser, averify_token, bearer_token, verify_token
+
+
+CUSTOMER_SESSION_KEY = '_market_customer'
+ORDER_SESSION_KEY = '_market_order_id'
+
+
+class Shopper:
+    # The customer behind a request and their open order, resolved at most
+    # once per request and remembered in the session between requests.
+    # Token requests take the customer from the token and never touch the
+    # session.
+
+    def __init__(self, request):
+        self.request = request
+
+    @property
+    def token(self):
+        return getattr(self.request, 'auth', None)
+
+    def remember(self, key, value):
+        if self.token is None:
+            self.request.session[key] = value
+
+    @cached_property
+    def customer_id(self):
+        user = self.request.user
+        if not user.is_authenticated:
+            return None
+        if self.token is not None:
+            if self.token['cid'] is not None:
+                return self.token['cid']
+        else:
+            cached = self.request.session.get(CUSTOMER_SESSION_KEY)
+            if cached and cached[0] == user.pk:
+                return cached[1]
+        customer_id = Customer.objects.filter(user_id=user.pk).values_list('id', flat=True).first()
+        if customer_id is not None:
+            self.remember(CUSTOMER_SESSION_KEY, [user.pk, customer_id])
+        return customer_id
+
+    @property
+    def order_id(self):
+        if self.token is not None:
+            return None
+        return self.request.session.get(ORDER_SESSION_KEY)
+
+    def open_order(self):
+        order = None
+        if self.order_id is not None:
+            order = Order.objects.filter(pk=self.order_id, customer_id=self.customer_id, status=1).first()
+        if order is None:
+            order = Order.objects.filter(customer_id=self.customer_id, status=1).first()
+            if order is None:
+                try:
+                    order = Order.initiate(customer=self.customer_id)
+                except ValueError:
+                    # A concurrent request opened it first.
+                    order = Order.objects.get(customer_id=self.customer_id, status=1)
+            self.remember(ORDER_SESSION_KEY, order.pk)
+        return order
+
+
+class Middleware:
+    # Base of the market middleware: runs sync or async to match the handler
+    # it wraps, so under ASGI the chain, and the async views, stay on the
+    # event loop instead of being run in a thread. Subclasses implement
+    # `handle` and `ahandle`.
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.ahandle(request)
+        return self.handle(request)
+
+
+class TokenAuthenticationMiddleware(Middleware):
+    # Authenticates `Authorization: Bearer <token>` requests; requests without
+    # the header keep the session user set by AuthenticationMiddleware.
+
+    def handle(self, request):
+        request.auth = None
+        token = bearer_token(request)
+        if token is not None:
+            try:
+                self.authenticate(request, verify_token(token))
+            except signing.BadSignature:
+                return self.rejected()
+        return self.get_response(request)
+
+    async def ahandle(self, request):
+        request.auth = None
+        token = bearer_token(request)
+        if token is not None:
+            try:
+                self.authenticate(request, await averify_token(token))
+            except signing.BadSignature:
+                return self.rejected()
+        return await self.get_response(request)
+
+    def authenticate(self, request, payload):
+        request.auth = payload
+        request.user = TokenUser(payload)
+
+    def rejected(self):
+        return JsonResponse({"message": "invalid token."}, status=401)
+
+
+class ShopperMiddleware(Middleware):
+
+    def handle(self, request):
+        request.shopper = Shopper(request)
+        return self.get_response(request)
+
+    async def ahandle(self, request):
+        request.shopper = Shopper(request)
+        return await self.get_response(request)
+
+
+class MetricsMiddleware(Middleware):
+    # Records latency, SQL queries and time, and response size per URL name
+    # into market.metrics; goes first in MIDDLEWARE to see the whole request.
+
+    def __init__(self, get_response):
+        if not settings.MARKET_METRICS:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def handle(self, request):
+        started = time.perf_counter()
+        with timed_queries() as queries:
+            response = self.get_response(request)
+        return self.record(request, response, started, queries)
+
+    async def ahandle(self, request):
+        started = time.perf_counter()
+        with timed_queries() as queries:
+            response = await self.get_response(request)
+        return self.record(request, response, started, queries)
+
+    def record(self, request, response, started, queries):
+        seconds = time.perf_counter() - started
+        match = request.resolver_match
+        registry.record(
+            match.url_name if match and match.url_name else 'unmatched',
+            request.method, response.status_code, seconds, queries.count, queries.seconds,
+            None if response.streaming else len(response.content),
+        )
+        return response
+
+
+class QueryCheckMiddleware(Middleware):
+    # Development and CI aid: reports query shapes a request repeats more than
+    # MARKET_QUERY_CHECK_THRESHOLD times, in the log and an X-Query-Check header.
+
+    def __init__(self, get_response):
+        if not settings.MARKET_QUERY_CHECK:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def handle(self, request):
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        return self.check(request, response, recorder)
+
+    async def ahandle(self, request):
+        with record_queries() as recorder:
+            response = await self.get_response(request)
+        return self.check(request, response, recorder)
+
+    def check(self, request, response, recorder):
+        repeated = recorder.repeated()
+        if repeated:
+            match = request.resolver_match
+            view = match.view_name if match else request.path
+            querycheck_logger.warning('repeated queries in %s: %s', view, recorder.report())
+            count, shape, site = repeated[0]
+            response['X-Query-Check'] = '{} repeated shapes; worst {}x at {}'.format(len(repeated), count, site)
+        return response
+
+
+class CompressionMiddleware(Middleware):
+    # Compresses responses of at least MARKET_COMPRESS_MIN_SIZE bytes, and
+    # streamed ones, with the best coding the client accepts.
+
+    def __init__(self, get_response):
+        if not settings.MARKET_COMPRESSION:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def handle(self, request):
+        return self.compress(request, self.get_response(request))
+
+    async def ahandle(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    def compress(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        if not response.streaming and len(response.content) < settings.MARKET_COMPRESS_MIN_SIZE:
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if coding is None:
+            return response
+        compressor = Compressor(coding)
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = compressor.astream(response.streaming_content)
+            else:
+                response.streaming_content = compressor.stream(response.streaming_content)
+            del response['Content-Length']
+        else:
+            response.content = compressor.whole(response.content)
+            response['Content-Length'] = str(len(response.content))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = coding
+        return response
+
+
+class ReadYourWritesMiddleware(Middleware):
+    # After a request that may have changed data, keeps the client's reads on
+    # the primary for MARKET_REPLICA_LAG seconds, by cookie and, for token
+    # requests, by user; see market.routers.
+
+    def __init__(self, get_response):
+        if not settings.MARKET_REPLICAS:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def handle(self, request):
+        response = self.get_response(request)
+        if self.changes(request):
+            key = primary_key(request)
+            if key is not None:
+                primary_cache().set(key, True, settings.MARKET_REPLICA_LAG)
+            self.stick(response)
+        return response
+
+    async def ahandle(self, request):
+        response = await self.get_response(request)
+        if self.changes(request):
+            key = primary_key(request)
+            if key is not None:
+                await primary_cache().aset(key, True, settings.MARKET_REPLICA_LAG)
+            self.stick(response)
+        return response
+
+    def changes(self, request):
+        return request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def stick(self, response):
+        response.set_cookie(PRIMARY_COOKIE, '1', max_age=settings.MARKET_REPLICA_LAG, httponly=True, samesite='Lax')
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Customer',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone', models.CharField(max_length=20)),
+                ('address', models.TextField()),
+                ('balance', models.IntegerField(default=20000)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_time', models.DateTimeField(auto_now_add=True)),
+                ('total_price', models.IntegerField(default=0)),
+                ('status', models.IntegerField(choices=[(1, 'shopping'), (2, 'sibmited'), (3, 'canceled'), (4, 'sent')])),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='market.customer')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Product',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=10, unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('price', models.PositiveIntegerField()),
+                ('inventory', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OrderRow',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField()),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='market.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='market.product')),
+            ],
+        ),
+    ]
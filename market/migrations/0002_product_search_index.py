@@ -0,0 +1,14 @@
+from django.db import migrations
+
+from market import search
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0001_initial'),
+    ]
+
+    operations = [
+        search.index_operation(search.PRODUCT_INDEX),
+    ]
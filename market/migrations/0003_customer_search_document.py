@@ -0,0 +1,38 @@
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Concat
+
+from market import search
+
+
+def backfill_search_documents(apps, schema_editor):
+    # Same document as Customer.refresh_search_documents.
+    Customer = apps.get_model('market', 'Customer')
+    User = apps.get_model('auth', 'User')
+    users = User.objects.filter(pk=OuterRef('user_id'))
+    Customer.objects.using(schema_editor.connection.alias).update(search_document=Concat(
+        Subquery(users.values('username')), Value(' '),
+        Subquery(users.values('first_name')), Value(' '),
+        Subquery(users.values('last_name')), Value(' '),
+        F('address'),
+        output_field=TextField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('market', '0002_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='search_document',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+        # After the backfill, so the index is built from the documents.
+        search.index_operation(search.CUSTOMER_INDEX),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_order_rows(apps, schema_editor):
+    # Rows written before unit_price/product_code/product_name existed take
+    # the product's current details, the price the old code charged.
+    OrderRow = apps.get_model('market', 'OrderRow')
+    Product = apps.get_model('market', 'Product')
+    products = Product.objects.using(schema_editor.connection.alias).filter(pk=OuterRef('product_id'))
+    OrderRow.objects.using(schema_editor.connection.alias).filter(product_code='').update(
+        unit_price=Subquery(products.values('price')),
+        product_code=Subquery(products.values('code')),
+        product_name=Subquery(products.values('name')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0003_customer_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderrow',
+            name='product_code',
+            field=models.CharField(default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='orderrow',
+            name='product_name',
+            field=models.CharField(default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='orderrow',
+            name='unit_price',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_order_rows, migrations.RunPython.noop),
+    ]
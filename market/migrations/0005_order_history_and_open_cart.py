@@ -0,0 +1,46 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_open_carts(apps, schema_editor):
+    # Before the one-open-cart constraint: a customer's older shopping carts
+    # are merged into their newest one, adding up the amounts of products
+    # in both, and then deleted.
+    Order = apps.get_model('market', 'Order')
+    OrderRow = apps.get_model('market', 'OrderRow')
+    db = schema_editor.connection.alias
+    carts = Order.objects.using(db).filter(status=1)
+    customers = carts.values('customer_id').annotate(carts=Count('id')).filter(carts__gt=1)
+    for customer_id in customers.values_list('customer_id', flat=True):
+        cart, *others = carts.filter(customer_id=customer_id).order_by('-order_time', '-id')
+        rows = {row.product_id: row for row in OrderRow.objects.using(db).filter(order=cart)}
+        for row in OrderRow.objects.using(db).filter(order__in=others).order_by('id'):
+            if row.product_id in rows:
+                rows[row.product_id].amount += row.amount
+                rows[row.product_id].save(update_fields=['amount'])
+            else:
+                row.order = cart
+                row.save(update_fields=['order'])
+                rows[row.product_id] = row
+        Order.objects.using(db).filter(pk__in=[other.pk for other in others]).delete()
+        cart.total_price = sum(row.amount * row.unit_price for row in rows.values())
+        cart.save(update_fields=['total_price'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0004_order_row_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'status', 'order_time'], name='market_order_history_idx'),
+        ),
+        migrations.RunPython(merge_open_carts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 1)), fields=('customer',), name='market_order_one_open_cart'),
+        ),
+    ]
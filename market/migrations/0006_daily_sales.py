@@ -0,0 +1,49 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0005_order_history_and_open_cart'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductDailySales',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.IntegerField(default=0)),
+                ('orders', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='market.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CustomerDailySales',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('revenue', models.IntegerField(default=0)),
+                ('orders', models.IntegerField(default=0)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='market.customer')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='productdailysales',
+            index=models.Index(fields=['day'], name='market_product_sales_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='productdailysales',
+            constraint=models.UniqueConstraint(fields=('product', 'day'), name='market_product_daily_sales_key'),
+        ),
+        migrations.AddIndex(
+            model_name='customerdailysales',
+            index=models.Index(fields=['day'], name='market_customer_sales_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='customerdailysales',
+            constraint=models.UniqueConstraint(fields=('customer', 'day'), name='market_customer_daily_sales_key'),
+        ),
+    ]
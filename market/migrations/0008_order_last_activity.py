@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0007_order_dispatch_claims'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='last_activity',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 1)), fields=['last_activity'], name='market_order_idle_cart_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_submitted_at(apps, schema_editor):
+    # Submission times were not kept; the rollups counted these orders on
+    # their order_time, so that is what they keep.
+    Order = apps.get_model('market', 'Order')
+    Order.objects.using(schema_editor.connection.alias).filter(status__in=[2, 3, 4]).update(
+        submitted_at=F('order_time'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0008_order_last_activity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='submitted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_submitted_at, migrations.RunPython.noop),
+    ]
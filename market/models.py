@@ -1,8 +1,14 @@
 from django.contrib.auth.models import User
-from django.db import models
-from django.db.models import Q
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Sum, TextField, Value, When
+from django.db.models.functions import Coalesce, Concat, TruncDate
+from django.utils import timezone
 from django.forms.formsets import ORDERING_FIELD_NAME
-from collections import OrderedDict
+
+from . import search
+from .cache import product_cache
+from .serializers import Serializer
 
 
 class JsonManager(models.Manager):
@@ -10,15 +16,16 @@ class JsonManager(models.Manager):
     def list_result(self):
         return super().get_queryset()
 
-    def product_search_result(self, keyword):
-        return super().get_queryset().filter(name__icontains=keyword)
+    def product_search_result(self, keyword, limit=None):
+        queryset = super().get_queryset()
+        return search.get_backend(queryset.db).search(
+            queryset, search.PRODUCT_INDEX, keyword, limit or settings.MARKET_SEARCH_LIMIT,
+        )
     
-    def customer_search_result(self, keyword):
-        return super().get_queryset().filter(
-            Q(address__icontains=keyword) |
-            Q(user__username__icontains=keyword) |
-            Q(user__first_name__icontains=keyword) |
-            Q(user__last_name__icontains=keyword)
+    def customer_search_result(self, keyword, limit=None):
+        queryset = super().get_queryset()
+        return search.get_backend(queryset.db).search(
+            queryset, search.CUSTOMER_INDEX, keyword, limit or settings.MARKET_SEARCH_LIMIT,
         )
     
     def query_result(self, pk):
@@ -32,108 +39,208 @@ class JsonManager(models.Manager):
     
 
 class ProductJsonManager(JsonManager):
-    
-    @staticmethod
-    def create_dict(data, query=False):
-        information_list = []
-        for product in data:
-            if query:
-                temp = OrderedDict()
-            else:
-                temp = dict()
-            temp['id'] = product.id
-            temp['code'] = product.code
-            temp['name'] = product.name
-            temp['price'] = product.price
-            temp['inventory'] = product.inventory
-            if query:
-                return temp
-            information_list.append(temp)
-        result = {
-            'products': information_list
-            }
-        return result
 
-    def list_result(self):
-        return ProductJsonManager.create_dict(super().list_result())
+    serializer = Serializer('id', 'code', 'name', 'price', 'inventory')
 
-    def product_search_result(self, keyword):
-        return ProductJsonManager.create_dict(super().product_search_result(keyword))
+    def list_result(self, columns=False):
+        return {'products': self.serializer.many(super().list_result(), columns)}
+
+    def product_search_result(self, keyword, limit=None, columns=False):
+        return {'products': self.serializer.many(super().product_search_result(keyword, limit), columns)}
     
     def query_result(self, pk):
-        return ProductJsonManager.create_dict(super().query_result(pk), query=True)
+        data = self.serializer.one(super().list_result().filter(pk=pk))
+        if data is None:
+            raise self.model.DoesNotExist('Product matching query does not exist.')
+        return data
+
+    def _queryset(self, keyword=None):
+        queryset = super().list_result()
+        if keyword is not None:
+            queryset = search.get_backend(queryset.db).filter(queryset, search.PRODUCT_INDEX, keyword)
+        return queryset
+
+    def page_result(self, limit, cursor=None, keyword=None, columns=False):
+        products, next_cursor = self.serializer.page(self._queryset(keyword), limit, cursor, columns=columns)
+        return {
+            'products': products,
+            'next': next_cursor,
+            }
+
+    def stream_result(self, keyword=None):
+        return self.serializer.iterator(self._queryset(keyword), settings.MARKET_STREAM_CHUNK_SIZE)
 
 
 class CustomerJsonManager(JsonManager):
 
-    @staticmethod
-    def create_dict(data, search=True):
-        information_list =[]
-        for customer in data:
-            temp = dict()
-            temp['id'] = customer.id
-            temp['username'] = customer.user.username
-            temp['first_name'] = customer.user.first_name
-            temp['last_name'] = customer.user.last_name
-            temp['email'] = customer.user.email
-            temp['phone'] = customer.phone
-            temp['address'] = customer.address
-            temp['balance'] = customer.balance
-            information_list.append(temp)
-        if search:
-            result = {
-                'customers': information_list
-                }
-            return result
-        return information_list[0]
+    serializer = Serializer(
+        'id',
+        ('username', 'user__username'),
+        ('first_name', 'user__first_name'),
+        ('last_name', 'user__last_name'),
+        ('email', 'user__email'),
+        'phone',
+        'address',
+        'balance',
+    )
 
-    def list_result(self):
-        return CustomerJsonManager.create_dict(super().list_result())
+    def _queryset(self, keyword=None):
+        queryset = super().list_result()
+        if keyword is not None:
+            queryset = search.get_backend(queryset.db).filter(queryset, search.CUSTOMER_INDEX, keyword)
+        return queryset
+
+    def list_result(self, columns=False):
+        return {'customers': self.serializer.many(self._queryset(), columns)}
 
-    def customer_search_result(self, keyword):
-        return CustomerJsonManager.create_dict(super().customer_search_result(keyword))
+    def customer_search_result(self, keyword, limit=None, columns=False):
+        return {'customers': self.serializer.many(super().customer_search_result(keyword, limit), columns)}
     
+    def detail_values(self, **lookup):
+        # values_list() rows; map them with serializer.to_dict.
+        return self.serializer.values(super().list_result().filter(**lookup))
+
     def query_result(self, pk):
-        return CustomerJsonManager.create_dict(super().query_result(pk), search=False)
+        data = self.serializer.one(super().list_result().filter(pk=pk))
+        if data is None:
+            raise self.model.DoesNotExist('Customer matching query does not exist.')
+        return data
+
+    def page_result(self, limit, cursor=None, keyword=None, columns=False):
+        customers, next_cursor = self.serializer.page(self._queryset(keyword), limit, cursor, columns=columns)
+        return {
+            'customers': customers,
+            'next': next_cursor,
+            }
+
+    def stream_result(self, keyword=None):
+        return self.serializer.iterator(self._queryset(keyword), settings.MARKET_STREAM_CHUNK_SIZE)
 
 
 class OrderJsonManager(JsonManager):
+
+    row_serializer = Serializer(
+        ('code', 'product_code'),
+        ('name', 'product_name'),
+        ('price', 'unit_price'),
+        'amount',
+    )
     
+    history_serializer = Serializer('id', 'order_time', 'status', 'total_price')
+
+    status_names = {1: 'shopping', 2: 'submitted', 3: 'canceled', 4: 'sent'}
+
     @staticmethod
-    def create_dict(data, total_price, errors=None, submit=None):
-        information_list =[]
-        result = dict()
-        for row in data:
-            temp = dict()
-            temp['code'] = row.product.code
-            temp['name'] = row.product.name
-            temp['price'] = row.product.price
-            temp['amount'] = row.amount
-            information_list.append(temp)
-        if submit:
-            for key, value in submit.items():
-                result[key] = value
+    def cart_dict(items, total_price, errors=None, submit=None):
+        result = dict(submit or ())
         result['total_price'] = total_price
         if errors:
             result['errors'] = errors
-        result['items'] = information_list
+        result['items'] = items
         return result
 
+    def snapshot(self, orders):
+        # The order with its total summed by the database, then its rows:
+        # two queries whatever the cart size, without touching products.
+        order = orders.annotate(
+            items_total=Coalesce(Sum(
+                F('rows__amount') * F('rows__unit_price'), output_field=models.IntegerField(),
+            ), 0),
+        ).values('id', 'order_time', 'items_total').first()
+        if order is None:
+            return None, []
+        rows = self.row_serializer.many(OrderRow.objects.using(orders.db).filter(order_id=order['id']).order_by('id'))
+        return order, rows
+
     def order_cart(self, pk, errors=None, submit=False):
-        order = super().query_result(pk)[0]
-        total_price = order.total_price
+        order, rows = self.snapshot(super().get_queryset().filter(pk=pk))
+        if order is None:
+            raise self.model.DoesNotExist('Order matching query does not exist.')
         if submit:
             submit = {
                 'id': pk,
-                'order_time': '{:%Y-%m-%d %H:%M:%S}'.format(order.order_time),
+                'order_time': '{:%Y-%m-%d %H:%M:%S}'.format(order['order_time']),
                 'status': 'submitted',
             }
-        return OrderJsonManager.create_dict(order.rows.all(), total_price, errors, submit)
+        return OrderJsonManager.cart_dict(rows, order['items_total'], errors, submit)
         
+    def history_result(self, customer, limit, cursor=None, status=None):
+        # Newest first, keyset-paginated on (order_time, id); served by the
+        # (customer, status, order_time) index.
+        queryset = super().get_queryset().filter(customer=customer)
+        if status is not None:
+            queryset = queryset.filter(status=status)
+        orders, next_cursor = self.history_serializer.page(
+            queryset, limit, cursor, key=('order_time', 'id'), descending=True,
+        )
+        for order in orders:
+            order['order_time'] = '{:%Y-%m-%d %H:%M:%S}'.format(order['order_time'])
+            order['status'] = self.status_names[order['status']]
+        return {
+            'orders': orders,
+            'next': next_cursor,
+            }
+
     def customer_cart(self, customer):
-        order = super().cart_list(customer=customer)
-        total_price = order.total_price
-        return OrderJsonManager.create_dict(order.rows.all(), total_price)
+        order, rows = self.snapshot(super().get_queryset().filter(customer=customer, status=1))
+        if order is None:
+            return OrderJsonManager.cart_dict([], 0)
+        return OrderJsonManager.cart_dict(rows, order['items_total'])
+
+
+class ProductManager(models.Manager):
+
+    def adjust_inventory(self, deltas, field='pk'):
+        # Applies {key: delta} with one conditional UPDATE per batch of
+        # products; if any product is missing or would go below zero nothing
+        # is changed.
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        keys = list(deltas)
+        batch_size = settings.MARKET_INVENTORY_BATCH_SIZE
+        updated = 0
+        with transaction.atomic(using=self.db):
+            for start in range(0, len(keys), batch_size):
+                batch = keys[start:start + batch_size]
+                # Only decreases need the stock; an increase applies even to a
+                # product that is already below zero.
+                increases = [key for key in batch if deltas[key] > 0]
+                decreases = [key for key in batch if deltas[key] < 0]
+                enough = Q(**{field + '__in': increases})
+                if decreases:
+                    enough |= Q(**{field + '__in': decreases, 'inventory__gte': Case(
+                        *[When(**{field: key, 'then': -deltas[key]}) for key in decreases],
+                        output_field=models.IntegerField(),
+                    )})
+                updated += self.get_queryset().filter(enough).update(inventory=Case(
+                    *[When(**{field: key, 'then': F('inventory') + deltas[key]}) for key in batch],
+                    default=F('inventory'),
+                    output_field=models.IntegerField(),
+                ))
+            if updated != len(deltas):
+                raise ValueError('inventory shortage.')
+            if updated:
+                product_cache.invalidate_on_commit(using=self.db)
+        return updated
+
+    def inventory_levels(self, keys, field='code'):
+        keys = list(keys)
+        batch_size = settings.MARKET_INVENTORY_BATCH_SIZE
+        levels = {}
+        for start in range(0, len(keys), batch_size):
+            levels.update(self.get_queryset().filter(
+                **{field + '__in': keys[start:start + batch_size]}
+            ).values_list(field, 'inventory'))
+        return levels
+
+    def inventory_shortages(self, deltas, field='code'):
+        levels = self.inventory_levels(deltas, field)
+        errors = []
+        for key, delta in deltas.items():
+            if key not in levels:
+                errors.append({'code': key, 'message': 'Product matching query does not exist.'})
+            elif delta < 0 and levels[key] + delta < 0:
+                errors.append({'code': key, 'message': 'inventory shortage.'})
+        return errors
 
 
 class Product(models.Model):
@@ -142,19 +249,16 @@ class Product(models.Model):
     price = models.PositiveIntegerField()
     inventory = models.IntegerField(default=0)
 
-    objects = models.Manager()
+    objects = ProductManager()
     get_json = ProductJsonManager()
 
     def increase_inventory(self, amount):
+        Product.objects.adjust_inventory({self.pk: amount})
         self.inventory += amount
-        self.save()
 
     def decrease_inventory(self, amount):
-        if self.inventory >= amount:
-            self.inventory -= amount
-            self.save()
-        else:
-            raise ValueError('inventory shortage.')
+        Product.objects.adjust_inventory({self.pk: -amount})
+        self.inventory -= amount
     
 
 class Customer(models.Model):
@@ -162,11 +266,38 @@ class Customer(models.Model):
     phone = models.CharField(max_length=20)
     address = models.TextField()
     balance = models.IntegerField(default=20000)
+    # username, first name, last name and address, kept for the search index.
+    search_document = models.TextField(default='', editable=False)
 
 
     objects = models.Manager()
     get_json = CustomerJsonManager()
 
+    @staticmethod
+    def build_search_document(user, address):
+        return ' '.join([user.username, user.first_name, user.last_name, address])
+
+    @staticmethod
+    def refresh_search_documents(queryset=None):
+        if queryset is None:
+            queryset = Customer.objects.all()
+        users = User.objects.filter(pk=OuterRef('user_id'))
+        return queryset.update(search_document=Concat(
+            Subquery(users.values('username')), Value(' '),
+            Subquery(users.values('first_name')), Value(' '),
+            Subquery(users.values('last_name')), Value(' '),
+            F('address'),
+            output_field=TextField(),
+        ))
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'address' in update_fields:
+            self.search_document = Customer.build_search_document(self.user, self.address)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'search_document'}
+        super().save(*args, **kwargs)
+
 
     def deposit(self, amount):
         self.balance += amount
@@ -184,14 +315,25 @@ class OrderRow(models.Model):
     product = models.ForeignKey('Product', on_delete=models.CASCADE)
     order = models.ForeignKey('Order',  related_name='rows', on_delete=models.CASCADE)
     amount = models.IntegerField()
+    # Product details at the time it was added to the order.
+    unit_price = models.PositiveIntegerField(default=0)
+    product_code = models.CharField(max_length=10, default='')
+    product_name = models.CharField(max_length=100, default='')
+
+    @staticmethod
+    def for_product(order, product, amount):
+        return OrderRow(
+            order=order, product=product, amount=amount,
+            unit_price=product.price, product_code=product.code, product_name=product.name,
+        )
 
     def increase_total_price_of_order(self, amount):
-        total_price = self.product.price * amount
+        total_price = self.unit_price * amount
         self.order.total_price += total_price
         self.order.save()
     
     def decrease_total_price_of_order(self, amount):
-        total_price = self.product.price * amount
+        total_price = self.unit_price * amount
         self.order.total_price -= total_price
         self.order.save()
 
@@ -214,19 +356,45 @@ class Order(models.Model):
     order_time = models.DateTimeField(auto_now_add=True)
     total_price = models.IntegerField(default=0)
     status = models.IntegerField(choices=status_choices)
+    # When the order was submitted; its sales count for this day.
+    submitted_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Set while a dispatch worker holds the submitted order; see market.dispatch.
+    claimed_by = models.CharField(max_length=100, null=True, blank=True, editable=False)
+    claimed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Last change to the cart; idle carts are removed by sweep_carts.
+    last_activity = models.DateTimeField(auto_now=True)
 
 
     objects = models.Manager()
     get_json = OrderJsonManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'status', 'order_time'], name='market_order_history_idx'),
+            # The dispatch queue: submitted orders in id order.
+            models.Index(fields=['id'], condition=Q(status=2), name='market_order_dispatch_idx'),
+            # Shopping carts by idle time, for the cart sweeper.
+            models.Index(fields=['last_activity'], condition=Q(status=1), name='market_order_idle_cart_idx'),
+        ]
+        constraints = [
+            # One shopping cart per customer; also the index open-cart
+            # lookups probe.
+            models.UniqueConstraint(fields=['customer'], condition=Q(status=1), name='market_order_one_open_cart'),
+        ]
+
     @staticmethod
     def initiate(customer):
-        customer_orders = customer.orders.filter(status=1)
-        if not customer_orders:
-            order = Order.objects.create(customer=customer, status=1)
-            return order
-        else:
-            raise ValueError('you have a pending order.')
+        # `customer` may be a Customer or its id.
+        customer_id = getattr(customer, 'pk', customer)
+        customer_orders = Order.objects.filter(customer_id=customer_id, status=1)
+        if not customer_orders.exists():
+            try:
+                with transaction.atomic():
+                    return Order.objects.create(customer_id=customer_id, status=1)
+            except IntegrityError:
+                # Another request opened one since the check above.
+                pass
+        raise ValueError('you have a pending order.')
 
     def add_product(self, product, amount):
         if self.status != 1:
@@ -241,7 +409,8 @@ class Order(models.Model):
             row.save()
             row.increase_total_price_of_order(amount=amount)
         else:
-            new_row = self.rows.create(product=product, amount=amount)
+            new_row = OrderRow.for_product(self, product, amount)
+            new_row.save()
             new_row.increase_total_price_of_order(amount=amount)
         
 
@@ -263,41 +432,272 @@ class Order(models.Model):
             row.save()
             row.decrease_total_price_of_order(amount=amount)
 
+    def _parse_items(self, items, optional_amount=False):
+        entries = []
+        for item in items:
+            code = None
+            try:
+                code = item['code']
+                amount = item.get('amount') if optional_amount else item['amount']
+                if amount is not None:
+                    amount = int(amount)
+            except Exception as error:
+                entries.append((code, None, error))
+            else:
+                entries.append((code, amount, None))
+        return entries
+
+    def _apply_items(self, items, apply, optional_amount=False):
+        # `apply` returns the new state of the row (None to delete it) and the
+        # price delta, or raises to report the item as an error.
+        entries = self._parse_items(items, optional_amount)
+        errors = []
+        with transaction.atomic():
+            status = Order.objects.select_for_update().filter(pk=self.pk).values_list('status', flat=True).first()
+            codes = {code for code, _, error in entries if error is None}
+            products = Product.objects.in_bulk(codes, field_name='code') if codes else {}
+            existing = {
+                row.product_id: row
+                for row in self.rows.filter(product__in=list(products.values()))
+            }
+            rows = dict(existing)
+            touched = set()
+            delta = 0
+            for code, amount, error in entries:
+                try:
+                    if error is not None:
+                        raise error
+                    product = products.get(code)
+                    if product is None:
+                        raise Product.DoesNotExist('Product matching query does not exist.')
+                    if status != 1:
+                        raise ValueError('this order is not open.')
+                    row, price_delta = apply(rows.get(product.id), product, amount)
+                except Exception as error:
+                    errors.append({'code': code, 'message': error.args[0]})
+                    continue
+                if row is not None and row.pk is None and product.id in existing:
+                    # Re-added after being removed in the same payload.
+                    row.pk = existing[product.id].pk
+                rows[product.id] = row
+                touched.add(product.id)
+                delta += price_delta
+
+            created = [rows[pid] for pid in touched if rows[pid] is not None and rows[pid].pk is None]
+            updated = [rows[pid] for pid in touched if rows[pid] is not None and rows[pid].pk is not None]
+            deleted = [existing[pid].pk for pid in touched if rows[pid] is None and pid in existing]
+            if created:
+                OrderRow.objects.bulk_create(created)
+            if updated:
+                OrderRow.objects.bulk_update(updated, ['amount', 'unit_price', 'product_code', 'product_name'])
+            if deleted:
+                OrderRow.objects.filter(pk__in=deleted).delete()
+            if touched:
+                self.last_activity = timezone.now()
+                Order.objects.filter(pk=self.pk).update(
+                    total_price=F('total_price') + delta, last_activity=self.last_activity,
+                )
+                self.total_price += delta
+        return errors
+
+    def add_products(self, items):
+        def apply(row, product, amount):
+            if amount == 0 or amount > product.inventory:
+                raise ValueError('you can not add zero or more than our inventory.')
+            if row is None:
+                return OrderRow.for_product(self, product, amount), product.price * amount
+            if row.amount + amount > product.inventory:
+                raise ValueError('you can not buy more than our inventory.')
+            row.amount += amount
+            return row, row.unit_price * amount
+        return self._apply_items(items, apply)
+
+    def remove_products(self, items):
+        def apply(row, product, amount):
+            if row is None:
+                raise ValueError('you can\'t remove a row that does not exists.')
+            if amount is None:
+                return None, -row.unit_price * row.amount
+            if row.amount < amount:
+                raise ValueError('you do not have this much items in your order row.')
+            row.amount -= amount
+            return row, -row.unit_price * amount
+        return self._apply_items(items, apply, optional_amount=True)
+
     def submit(self):
-        if self.status == 1:
-            rows = self.rows.all()
+        with transaction.atomic():
+            order = Order.objects.select_for_update().get(pk=self.pk)
+            if order.status != 1:
+                raise ValueError('you do not have an open order.')
+            rows = list(order.rows.values_list('product_id', 'amount', 'unit_price'))
             if not rows:
                 raise ValueError('you can not submit empty orders.')
-            customer = self.customer
-            if self.total_price > customer.balance:
+            order.total_price = sum(amount * unit_price for _, amount, unit_price in rows)
+            charged = Customer.objects.filter(
+                pk=order.customer_id, balance__gte=order.total_price,
+            ).update(balance=F('balance') - order.total_price)
+            if not charged:
                 raise ValueError('you can\'t submit an order with higher price than your balance.')
-            for row in rows:
-                amount = row.amount
-                product = row.product
-                product.decrease_inventory(amount)
-            customer.spend(self.total_price)
-            self.status = 2
-            self.save()
-        else:
-            raise ValueError('you do not have an open order.')
+            Product.objects.adjust_inventory({pk: -amount for pk, amount, _ in rows})
+            order.submitted_at = timezone.now()
+            Order.objects.filter(pk=self.pk).update(
+                status=2, total_price=order.total_price, submitted_at=order.submitted_at,
+            )
+            order.record_sales(rows, sign=1)
+        self.total_price = order.total_price
+        self.submitted_at = order.submitted_at
+        self.status = 2
 
     def cancel(self):
-        if self.status == 2:
-            rows = self.rows.all()
-            customer = self.customer
-            for row in rows:
-                amount = row.amount
-                product = row.product
-                product.increase_inventory(amount)
-            customer.deposit(self.total_price)
-            self.status = 3
-            self.save()
-        else:
-            raise ValueError('you do not have a submited order.')
+        with transaction.atomic():
+            order = Order.objects.select_for_update().get(pk=self.pk)
+            if order.status != 2:
+                raise ValueError('you do not have a submited order.')
+            rows = list(order.rows.values_list('product_id', 'amount', 'unit_price'))
+            Product.objects.adjust_inventory({pk: amount for pk, amount, _ in rows})
+            Customer.objects.filter(pk=order.customer_id).update(balance=F('balance') + order.total_price)
+            Order.objects.filter(pk=self.pk).update(status=3)
+            order.record_sales(rows, sign=-1)
+        self.total_price = order.total_price
+        self.status = 3
+
+    def record_sales(self, rows, sign):
+        # Adds (sign=1) or takes back (sign=-1) this order's rows, given as
+        # (product_id, amount, unit_price), in the daily sales rollups.
+        day = sales_day(self.submitted_at)
+        products = {}
+        for product_id, amount, unit_price in rows:
+            units, revenue, orders = products.get(product_id, (0, 0, 0))
+            products[product_id] = (units + sign * amount, revenue + sign * amount * unit_price, sign)
+        ProductDailySales.objects.add(day, products)
+        CustomerDailySales.objects.add(day, {self.customer_id: (sign * self.total_price, sign)})
 
     def send(self):
-        if self.status == 2:
-            self.status = 4
-            self.save()
-        else:
-            raise ValueError('you do not have a submited order.')
\ No newline at end of file
+        if self.status != 2 or not Order.objects.filter(pk=self.pk, status=2).update(
+                status=4, claimed_by=None, claimed_at=None):
+            raise ValueError('you do not have a submited order.')
+        self.status = 4
+
+
+def sales_day(moment):
+    # The day a sale counts for: the submission date in the current time zone,
+    # as TruncDate computes it for the backfill.
+    if timezone.is_aware(moment):
+        moment = timezone.localtime(moment)
+    return moment.date()
+
+
+class RollupManager(models.Manager):
+    # Rollup rows hold running sums per (key, day); `add` changes them with
+    # one insert of the missing rows and one UPDATE per day.
+
+    def add(self, day, deltas):
+        # `deltas` maps key ids to a tuple of deltas for `model.measures`.
+        deltas = {key: values for key, values in deltas.items() if any(values)}
+        if not deltas:
+            return
+        key = self.model.key + '_id'
+        self.bulk_create([self.model(**{key: pk, 'day': day}) for pk in deltas], ignore_conflicts=True)
+        self.filter(**{'day': day, key + '__in': list(deltas)}).update(**{
+            measure: F(measure) + Case(
+                *[When(**{key: pk, 'then': values[index]}) for pk, values in deltas.items()],
+                default=0,
+                output_field=models.IntegerField(),
+            )
+            for index, measure in enumerate(self.model.measures)
+        })
+
+    def in_range(self, start, end):
+        return self.get_queryset().filter(day__gte=start, day__lte=end)
+
+    def _sums(self, start, end, group_by, filters):
+        return self.in_range(start, end).filter(**filters).values(*group_by).annotate(
+            **{measure: Sum(measure) for measure in self.model.measures}
+        )
+
+    def totals_result(self, start, end, limit=None, **filters):
+        # Sums over [start, end] per key, largest revenue first.
+        serializer = self.model.totals_serializer
+        group_by = serializer.lookups[:-len(self.model.measures)]
+        queryset = self._sums(start, end, group_by, filters).order_by('-revenue', *group_by)
+        return serializer.many(queryset[:limit] if limit is not None else queryset)
+
+    def series_result(self, start, end, **filters):
+        # Sums over [start, end] per day.
+        return self.model.series_serializer.many(self._sums(start, end, ['day'], filters).order_by('day'))
+
+    def rebuild(self, start, end, sales):
+        # Replaces the rows of [start, end] with `sales`, a values() queryset
+        # of ('key', 'day', *measures) aggregated from order history.
+        key = self.model.key + '_id'
+        self.in_range(start, end).delete()
+        return self.bulk_create([
+            self.model(**{key: row['key'], 'day': row['day']}, **{measure: row[measure] for measure in self.model.measures})
+            for row in sales
+        ], batch_size=1000)
+
+
+class ProductDailySales(models.Model):
+    key = 'product'
+    measures = ('units', 'revenue', 'orders')
+
+    product = models.ForeignKey('Product', related_name='daily_sales', on_delete=models.CASCADE)
+    day = models.DateField()
+    units = models.IntegerField(default=0)
+    revenue = models.IntegerField(default=0)
+    orders = models.IntegerField(default=0)
+
+    objects = RollupManager()
+
+    totals_serializer = Serializer(('code', 'product__code'), ('name', 'product__name'), *measures)
+    series_serializer = Serializer('day', *measures)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='market_product_daily_sales_key'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='market_product_sales_day_idx'),
+        ]
+
+    @staticmethod
+    def history(orders):
+        return OrderRow.objects.using(orders.db).filter(order__in=orders).annotate(
+            key=F('product_id'), day=TruncDate('order__submitted_at'),
+        ).values('key', 'day').annotate(
+            units=Sum('amount'),
+            revenue=Sum(F('amount') * F('unit_price'), output_field=models.IntegerField()),
+            orders=Count('order_id', distinct=True),
+        ).order_by()
+
+
+class CustomerDailySales(models.Model):
+    key = 'customer'
+    measures = ('revenue', 'orders')
+
+    customer = models.ForeignKey('Customer', related_name='daily_sales', on_delete=models.CASCADE)
+    day = models.DateField()
+    revenue = models.IntegerField(default=0)
+    orders = models.IntegerField(default=0)
+
+    objects = RollupManager()
+
+    totals_serializer = Serializer(('id', 'customer_id'), ('username', 'customer__user__username'), *measures)
+    series_serializer = Serializer('day', *measures)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'day'], name='market_customer_daily_sales_key'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='market_customer_sales_day_idx'),
+        ]
+
+    @staticmethod
+    def history(orders):
+        return orders.annotate(
+            key=F('customer_id'), day=TruncDate('submitted_at'),
+        ).values('key', 'day').annotate(
+            revenue=Sum('total_price'),
+            orders=Count('id'),
+        ).order_by()
@@ -0,0 +1,71 @@
+import base64
+import datetime
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        return json.loads(raw.decode('utf-8'))
+    except (ValueError, TypeError):
+        raise ValueError('bad cursor.')
+
+
+def page_params(query):
+    limit = int(query.get('limit', settings.MARKET_PAGE_SIZE))
+    if limit < 1 or limit > settings.MARKET_MAX_PAGE_SIZE:
+        raise ValueError('limit out of range.')
+    cursor = query.get('cursor')
+    if cursor:
+        cursor = decode_cursor(cursor)
+    return limit, cursor
+
+
+def cursor_value(value):
+    # Datetimes keep their microseconds, which DjangoJSONEncoder would drop.
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+def keyset_page(queryset, limit, cursor=None, key='id', column=None, descending=False):
+    # Returns one page of a values() queryset ordered by `key` and the cursor
+    # of the next page, or None when this is the last one. For values_list()
+    # querysets `column` is the position of `key` in the rows. `key` may be a
+    # tuple of fields (with a tuple of columns) ordered together.
+    keys = key if isinstance(key, tuple) else (key,)
+    if column is None:
+        columns = keys
+    else:
+        columns = column if isinstance(column, tuple) else (column,)
+    if cursor is not None:
+        values = cursor if isinstance(key, tuple) else [cursor]
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError('bad cursor.')
+        for name, value in zip(keys, values):
+            # Cursors come from clients; only scalars of the key's type.
+            if isinstance(value, bool) or not isinstance(value, int if name == 'id' else (int, float, str)):
+                raise ValueError('bad cursor.')
+        lookup = '__lt' if descending else '__gt'
+        after = Q()
+        for index, name in enumerate(keys):
+            after |= Q(**dict(zip(keys[:index], values[:index])), **{name + lookup: values[index]})
+        try:
+            queryset = queryset.filter(after)
+        except (TypeError, ValidationError):
+            raise ValueError('bad cursor.')
+    rows = list(queryset.order_by(*[('-' if descending else '') + name for name in keys])[:limit + 1])
+    if len(rows) > limit:
+        rows = rows[:limit]
+        values = [cursor_value(rows[-1][position]) for position in columns]
+        return rows, encode_cursor(values if isinstance(key, tuple) else values[0])
+    return rows, None
@@ -0,0 +1,99 @@
+import logging
+import os
+import re
+import threading
+import traceback
+
+from django.conf import settings
+
+from . import metrics
+
+
+"""
+    Finds N+1 patterns: within one request (or block of code) SQL is reduced
+    to its shape, and shapes run more often than a threshold are reported
+    with the code that ran them.
+"""
+
+
+logger = logging.getLogger('market.querycheck')
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LIST = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+_SPACE = re.compile(r'\s+')
+
+# Frames from these directories are not call sites worth reporting.
+_LIBRARY_PATHS = tuple(
+    os.path.dirname(os.path.dirname(module.__file__)) for module in (logging, __import__('django'))
+)
+
+
+# Nor are the query observers' own frames.
+_OWN_FILES = (__file__, metrics.__file__)
+
+
+def normalize(sql):
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _LIST.sub('(...)', sql.replace('%s', '?'))
+    return _SPACE.sub(' ', sql).strip()
+
+
+def call_site():
+    for frame in reversed(traceback.extract_stack()[:-3]):
+        if not frame.filename.startswith(_LIBRARY_PATHS) and frame.filename not in _OWN_FILES:
+            return '{}:{} in {}'.format(os.path.relpath(frame.filename, settings.BASE_DIR), frame.lineno, frame.name)
+    return None
+
+
+class QueryRecorder:
+    # An execute wrapper grouping queries by shape. The stack is only walked
+    # when a shape crosses the threshold.
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.count = 0
+        self.shapes = {}
+        self.sites = {}
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        shape = normalize(sql)
+        try:
+            statement = (sql, tuple(params) if params is not None and not many else None)
+        except TypeError:
+            statement = None
+        with self.lock:
+            self.count += 1
+            seen = self.shapes[shape] = self.shapes.get(shape, 0) + 1
+            if statement is not None:
+                self.statements[statement] = self.statements.get(statement, 0) + 1
+        if seen == self.threshold + 1:
+            self.sites[shape] = call_site()
+        return execute(sql, params, many, context)
+
+    def repeated(self):
+        # [(count, shape, call site)] for shapes over the threshold, worst first.
+        return sorted(
+            ((count, shape, self.sites.get(shape)) for shape, count in self.shapes.items() if count > self.threshold),
+            reverse=True,
+        )
+
+    def duplicates(self):
+        # Identical statements with identical parameters run more than once.
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+    def report(self):
+        return '{} queries, {} duplicated; '.format(self.count, self.duplicates()) + '; '.join(
+            '{}x {!r} at {}'.format(count, shape, site) for count, shape, site in self.repeated()
+        )
+
+
+def record_queries(threshold=None):
+    # Sees the queries of every thread the context runs in; see
+    # metrics.observe_queries.
+    return metrics.observe_queries(
+        QueryRecorder(settings.MARKET_QUERY_CHECK_THRESHOLD if threshold is None else threshold)
+    )
@@ -0,0 +1,154 @@
+import contextlib
+import contextvars
+import functools
+import inspect
+import random
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+"""
+    Read replicas: views wrapped in `replica_view` read the market tables from
+    one of MARKET_REPLICAS; every write, every read inside a transaction and
+    every other view stays on the primary. A client that has just changed
+    something is kept on the primary until the replicas have caught up: by
+    a cookie, or for token clients, which need not keep cookies, by a cache
+    entry for the token's user. Responses with a body read from a replica
+    drop the ETag and Last-Modified taken from the primary's cache version.
+"""
+
+
+PRIMARY_COOKIE = 'market_primary'
+PRIMARY_PREFIX = 'market:primary:'
+
+
+class ReplicaReads:
+    # Set in the context while replica reads are on; `used` records whether
+    # any query actually went to a replica.
+
+    def __init__(self):
+        self.used = False
+
+
+_replica_reads = contextvars.ContextVar('market_replica_reads', default=None)
+
+
+@contextlib.contextmanager
+def replica_reads(enabled=True):
+    reads = ReplicaReads() if enabled else None
+    token = _replica_reads.set(reads)
+    try:
+        yield reads
+    finally:
+        _replica_reads.reset(token)
+
+
+def primary_reads():
+    return replica_reads(False)
+
+
+class ReplicaRouter:
+
+    def replica(self, model):
+        reads = _replica_reads.get()
+        if not settings.MARKET_REPLICAS or reads is None:
+            return None
+        if model._meta.app_label != 'market' or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        reads.used = True
+        return random.choice(settings.MARKET_REPLICAS)
+
+    def db_for_read(self, model, **hints):
+        return self.replica(model) or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas are copies of the primary (see sync_replica).
+        if db in settings.MARKET_REPLICAS:
+            return False
+        return None
+
+
+def primary_key(request):
+    # The cache key that keeps a token client on the primary.
+    auth = getattr(request, 'auth', None)
+    if auth is None:
+        return None
+    return PRIMARY_PREFIX + str(auth['uid'])
+
+
+def primary_cache():
+    return caches[settings.MARKET_CACHE_ALIAS]
+
+
+def may_use_replica(request):
+    return bool(settings.MARKET_REPLICAS) and request.method in ('GET', 'HEAD') \
+        and PRIMARY_COOKIE not in request.COOKIES
+
+
+def use_replica(request):
+    if not may_use_replica(request):
+        return False
+    key = primary_key(request)
+    return key is None or not primary_cache().get(key)
+
+
+async def ause_replica(request):
+    if not may_use_replica(request):
+        return False
+    key = primary_key(request)
+    return key is None or not await primary_cache().aget(key)
+
+
+def _stream(content):
+    with replica_reads():
+        yield from content
+
+
+async def _astream(content):
+    with replica_reads():
+        async for chunk in content:
+            yield chunk
+
+
+def replica_view(view):
+    # Lets a read-only view, sync or async, read from a replica. Streamed
+    # bodies are produced after the view returns, so they get the same
+    # setting.
+    if inspect.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            enabled = await ause_replica(request)
+            with replica_reads(enabled) as reads:
+                response = await view(request, *args, **kwargs)
+            if enabled:
+                from_replica(response, reads, _astream)
+            return response
+    else:
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            enabled = use_replica(request)
+            with replica_reads(enabled) as reads:
+                response = view(request, *args, **kwargs)
+            if enabled:
+                from_replica(response, reads, _stream)
+            return response
+    return wrapper
+
+
+def from_replica(response, reads, stream):
+    if response.streaming:
+        response.streaming_content = stream(response.streaming_content)
+    if response.streaming or reads.used:
+        # A lagging replica's body must not be revalidated against the
+        # primary's version, or the client keeps it after the replica
+        # catches up.
+        del response['ETag']
+        del response['Last-Modified']
@@ -0,0 +1,186 @@
+import sqlite3
+
+from django.conf import settings
+from django.db import connections, migrations
+from django.db.models import Case, IntegerField, Q, When
+from django.utils.module_loading import import_string
+
+
+class SearchIndex:
+
+    def __init__(self, name, table, column, lookups):
+        self.name = name
+        self.table = table
+        # Indexed text column, also the model field name.
+        self.column = column
+        # ORM lookups used by backends that scan the base tables instead.
+        self.lookups = lookups
+
+
+PRODUCT_INDEX = SearchIndex('product', 'market_product', 'name', ['name'])
+
+CUSTOMER_INDEX = SearchIndex(
+    'customer', 'market_customer', 'search_document',
+    ['address', 'user__username', 'user__first_name', 'user__last_name'],
+)
+
+INDEXES = [PRODUCT_INDEX, CUSTOMER_INDEX]
+
+
+class ContainsBackend:
+    # Plain `icontains` scan; works everywhere, used as the fallback.
+
+    def install(self, connection, index):
+        pass
+
+    def uninstall(self, connection, index):
+        pass
+
+    def rebuild(self, connection, index):
+        pass
+
+    def filter(self, queryset, index, keyword):
+        condition = Q()
+        for lookup in index.lookups:
+            condition |= Q(**{lookup + '__icontains': keyword})
+        return queryset.filter(condition)
+
+    def search(self, queryset, index, keyword, limit):
+        return self.filter(queryset, index, keyword).order_by('pk')[:limit]
+
+
+class SQLiteFTSBackend(ContainsBackend):
+    # FTS5 external-content table with the trigram tokenizer, so a match is
+    # still a case-insensitive substring match like `icontains`. Triggers
+    # keep it in sync with the base table, including bulk writes. SQLite
+    # drops the triggers when a migration rebuilds the base table, so such
+    # a migration has to uninstall the index first and install it after.
+
+    min_length = 3
+
+    def install(self, connection, index):
+        fts = index.table + '_fts'
+        with connection.cursor() as cursor:
+            exists = fts in connection.introspection.table_names(cursor)
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                "{column}, content='{table}', content_rowid='id', tokenize='trigram')"
+                .format(fts=fts, table=index.table, column=index.column)
+            )
+            cursor.execute(
+                "CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+                "INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END"
+                .format(fts=fts, table=index.table, column=index.column)
+            )
+            cursor.execute(
+                "CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+                "INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); END"
+                .format(fts=fts, table=index.table, column=index.column)
+            )
+            cursor.execute(
+                "CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column} ON {table} BEGIN "
+                "INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); "
+                "INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END"
+                .format(fts=fts, table=index.table, column=index.column)
+            )
+        if not exists:
+            self.rebuild(connection, index)
+
+    def uninstall(self, connection, index):
+        fts = index.table + '_fts'
+        with connection.cursor() as cursor:
+            for suffix in ('_ai', '_ad', '_au'):
+                cursor.execute('DROP TRIGGER IF EXISTS {}'.format(fts + suffix))
+            cursor.execute('DROP TABLE IF EXISTS {}'.format(fts))
+
+    def rebuild(self, connection, index):
+        fts = index.table + '_fts'
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO {fts}({fts}) VALUES ('rebuild')".format(fts=fts))
+
+    def _match(self, keyword):
+        return '"{}"'.format(keyword.replace('"', '""'))
+
+    def filter(self, queryset, index, keyword):
+        if len(keyword) < self.min_length:
+            return super().filter(queryset, index, keyword)
+        fts = index.table + '_fts'
+        return queryset.extra(
+            where=['"{table}"."id" IN (SELECT rowid FROM {fts} WHERE {fts} MATCH %s)'.format(table=index.table, fts=fts)],
+            params=[self._match(keyword)],
+        )
+
+    def search(self, queryset, index, keyword, limit):
+        if len(keyword) < self.min_length:
+            return super().search(queryset, index, keyword, limit)
+        fts = index.table + '_fts'
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                "SELECT rowid FROM {fts} WHERE {fts} MATCH %s ORDER BY rank LIMIT %s".format(fts=fts),
+                [self._match(keyword), limit],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        ranking = Case(
+            *[When(pk=pk, then=position) for position, pk in enumerate(ids)],
+            output_field=IntegerField(),
+        )
+        return queryset.filter(pk__in=ids).order_by(ranking) if ids else queryset.none()
+
+
+class TrigramBackend(ContainsBackend):
+    # PostgreSQL pg_trgm: a GIN trigram index serves the `icontains` scan and
+    # similarity() ranks the matches.
+
+    def install(self, connection, index):
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS {table}_{column}_trgm ON {table} "
+                "USING gin (upper({column}::text) gin_trgm_ops)"
+                .format(table=index.table, column=index.column)
+            )
+
+    def uninstall(self, connection, index):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP INDEX IF EXISTS {table}_{column}_trgm".format(table=index.table, column=index.column))
+
+    def rebuild(self, connection, index):
+        with connection.cursor() as cursor:
+            cursor.execute("REINDEX INDEX {table}_{column}_trgm".format(table=index.table, column=index.column))
+
+    def filter(self, queryset, index, keyword):
+        return queryset.filter(**{index.column + '__icontains': keyword})
+
+    def search(self, queryset, index, keyword, limit):
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        return self.filter(queryset, index, keyword).order_by(
+            TrigramSimilarity(index.column, keyword).desc(), 'pk',
+        )[:limit]
+
+
+def default_backend(connection):
+    vendor = connection.vendor
+    if vendor == 'sqlite' and sqlite3.sqlite_version_info >= (3, 34, 0):
+        return SQLiteFTSBackend()
+    if vendor == 'postgresql':
+        return TrigramBackend()
+    return ContainsBackend()
+
+
+def get_backend(using='default'):
+    if settings.MARKET_SEARCH_BACKEND:
+        return import_string(settings.MARKET_SEARCH_BACKEND)()
+    return default_backend(connections[using])
+
+
+def index_operation(index):
+    # Migration operation building `index` with the database's own backend,
+    # and dropping it when the migration is unapplied.
+    def install(apps, schema_editor):
+        default_backend(schema_editor.connection).install(schema_editor.connection, index)
+
+    def uninstall(apps, schema_editor):
+        default_backend(schema_editor.connection).uninstall(schema_editor.connection, index)
+
+    return migrations.RunPython(install, uninstall)
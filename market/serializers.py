@@ -0,0 +1,124 @@
+import json
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse as DjangoJsonResponse
+from django.utils.module_loading import import_string
+
+from .pagination import keyset_page
+
+
+"""
+    Serializers read rows with values_list() and zip each tuple with the
+    response keys, so no model instance is ever built for a response.
+"""
+
+
+class Serializer:
+
+    def __init__(self, *fields):
+        # Each field is a name, or a (key, lookup) pair when the response key
+        # differs from the ORM lookup.
+        self.fields = tuple((field, field) if isinstance(field, str) else tuple(field) for field in fields)
+        self.keys = tuple(key for key, _ in self.fields)
+        self.lookups = tuple(lookup for _, lookup in self.fields)
+        keys = self.keys
+
+        def to_dict(row):
+            return dict(zip(keys, row))
+        self.to_dict = to_dict
+
+    def values(self, queryset):
+        return queryset.values_list(*self.lookups)
+
+    def columns(self, rows):
+        # Column-major form of values_list() rows: every key appears once.
+        rows = list(rows)
+        return {
+            'fields': list(self.keys),
+            'columns': [list(column) for column in zip(*rows)] if rows else [[] for _ in self.keys],
+        }
+
+    def many(self, queryset, columns=False):
+        if columns:
+            return self.columns(self.values(queryset))
+        return list(map(self.to_dict, self.values(queryset)))
+
+    def one(self, queryset):
+        row = self.values(queryset).first()
+        if row is None:
+            return None
+        return self.to_dict(row)
+
+    def iterator(self, queryset, chunk_size):
+        return map(self.to_dict, self.values(queryset).order_by('id').iterator(chunk_size=chunk_size))
+
+    def page(self, queryset, limit, cursor=None, key='id', columns=False, descending=False):
+        if isinstance(key, tuple):
+            column = tuple(self.lookups.index(name) for name in key)
+        else:
+            column = self.lookups.index(key)
+        rows, next_cursor = keyset_page(self.values(queryset), limit, cursor, key, column, descending)
+        if columns:
+            return self.columns(rows), next_cursor
+        return list(map(self.to_dict, rows)), next_cursor
+
+
+def orjson_dumps(data):
+    # orjson with Django's encoder for the types it leaves alone, so the
+    # payload decodes to exactly what the stdlib encoder would produce.
+    import orjson
+
+    return orjson.dumps(
+        data, default=DjangoJSONEncoder().default,
+        option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_SUBCLASS,
+    )
+
+
+def stdlib_dumps(data):
+    return json.dumps(data, cls=DjangoJSONEncoder)
+
+
+# The encoder last resolved, with the setting it came from.
+_encoder = (None, stdlib_dumps)
+
+
+def get_encoder():
+    global _encoder
+    path = settings.MARKET_JSON_ENCODER
+    if path != _encoder[0]:
+        try:
+            encoder = import_string(path) if path else stdlib_dumps
+            encoder({})
+        except ImportError as error:
+            raise ImproperlyConfigured('MARKET_JSON_ENCODER {!r} is not usable: {}'.format(path, error))
+        _encoder = (path, encoder)
+    return _encoder[1]
+
+
+def dumps(data):
+    # Encodes with MARKET_JSON_ENCODER, a dotted path to a function returning
+    # str or bytes (e.g. 'market.serializers.orjson_dumps').
+    return get_encoder()(data)
+
+
+def ndjson_line(data):
+    line = dumps(data)
+    if isinstance(line, str):
+        line = line.encode('utf-8')
+    return line + b'\n'
+
+
+class JsonResponse(DjangoJsonResponse):
+    # django.http.JsonResponse encoded by dumps() unless an encoder or
+    # json_dumps_params is passed.
+
+    def __init__(self, data, encoder=None, safe=True, json_dumps_params=None, **kwargs):
+        if encoder is not None or json_dumps_params is not None:
+            super().__init__(data, encoder or DjangoJSONEncoder, safe, json_dumps_params, **kwargs)
+            return
+        if safe and not isinstance(data, dict):
+            raise TypeError('In order to allow non-dict objects to be serialized set the safe parameter to False.')
+        kwargs.setdefault('content_type', 'application/json')
+        super(DjangoJsonResponse, self).__init__(content=dumps(data), **kwargs)
@@ -0,0 +1,29 @@
+from django.contrib.auth.models import User
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import product_cache
+from .metrics import install_observer
+from .models import Customer, Product
+
+
+SEARCHED_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=User)
+def refresh_customer_search_document(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and not SEARCHED_USER_FIELDS & set(update_fields)):
+        return
+    Customer.refresh_search_documents(Customer.objects.filter(user=instance))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, using, **kwargs):
+    product_cache.invalidate_on_commit(using=using)
+
+
+@receiver(connection_created)
+def observe_connection_queries(sender, connection, **kwargs):
+    install_observer(connection)
@@ -0,0 +1,84 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import TestCase
+
+from .models import Customer, Product
+from .querycheck import record_queries
+
+
+"""
+    Test helpers. assert_queries_do_not_grow() fails a test when an
+    endpoint's query count depends on how much data there is:
+
+        def grow(size):
+            Product.objects.bulk_create(...)   # bring the table to `size` rows
+
+        assert_queries_do_not_grow(lambda: client.get('/market/product/list/'), grow)
+
+    MarketTestCase is the base of the market tests: a logged in customer and
+    JSON helpers.
+"""
+
+
+def query_counts(call, grow, sizes):
+    # [(size, recorder)] after growing the data to each size in turn.
+    results = []
+    for size in sizes:
+        grow(size)
+        with record_queries() as recorder:
+            call()
+        results.append((size, recorder))
+    return results
+
+
+def assert_queries_do_not_grow(call, grow, sizes=(1, 10, 50), slack=0):
+    results = query_counts(call, grow, sizes)
+    smallest = results[0][1].count
+    size, largest = results[-1]
+    if largest.count > smallest + slack:
+        raise AssertionError('query count grows with data size: {}; at size {}: {}'.format(
+            ', '.join('{} rows -> {} queries'.format(size, recorder.count) for size, recorder in results),
+            size, largest.report(),
+        ))
+
+
+class QueryScalingMixin:
+    # For TestCase subclasses.
+
+    def assertQueriesDoNotGrow(self, call, grow, sizes=(1, 10, 50), slack=0):
+        try:
+            assert_queries_do_not_grow(call, grow, sizes, slack)
+        except AssertionError as error:
+            self.fail(str(error))
+
+
+def make_products(count, inventory=1000, price=10):
+    # Brings the catalog up to `count` products.
+    start = Product.objects.count()
+    Product.objects.bulk_create([
+        Product(code='p{:05d}'.format(number), name='product {}'.format(number), price=price, inventory=inventory)
+        for number in range(start, count)
+    ])
+
+
+def make_customer(username, balance=20000):
+    user = User.objects.create_user(username=username, password='secret')
+    return Customer.objects.create(user=user, phone='0912', address='Tehran', balance=balance)
+
+
+class MarketTestCase(QueryScalingMixin, TestCase):
+
+    def setUp(self):
+        # Cached pages and revoked tokens would outlive the rolled back data.
+        caches[settings.MARKET_CACHE_ALIAS].clear()
+        self.customer = make_customer('ali')
+        self.client.login(username='ali', password='secret')
+
+    def post(self, url, data, **extra):
+        return self.client.post(url, json.dumps(data), content_type='application/json', **extra)
+
+    def add(self, items):
+        return self.post('/market/shopping/cart/add_items/', items)
@@ -0,0 +1,80 @@
+import logging
+import threading
+import zlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.handlers.asgi import ASGIHandler
+from django.http import JsonResponse
+from django.test import TransactionTestCase, override_settings
+from django.urls import path
+
+from market import async_views
+from market.models import Product
+from market.testing import make_customer, make_products
+from market.tokens import issue_token, revoke_token, verify_token
+
+
+async def thread(request):
+    return JsonResponse({'thread': threading.get_ident()})
+
+
+urlpatterns = [
+    path('market/product/<int:pk>/', async_views.product_show),
+    path('market/product/list/', async_views.product_show),
+    path('market/customer/<int:pk>/', async_views.customer_show),
+    path('market/customer/list/', async_views.customer_show),
+    path('market/customer/profile/', async_views.customer_profile),
+    path('market/shopping/cart/', async_views.cart_show),
+    path('thread/', thread),
+]
+
+
+# Transactions so that the pool threads see the rows.
+@override_settings(ROOT_URLCONF=__name__, MARKET_COMPRESS_MIN_SIZE=200)
+class AsyncViewTests(TransactionTestCase):
+
+    def setUp(self):
+        caches[settings.MARKET_CACHE_ALIAS].clear()
+        self.customer = make_customer('ali')
+        make_products(20)
+        self.async_client.force_login(self.customer.user)
+        self.token = issue_token(self.customer.user, self.customer.pk)
+
+    @override_settings(DEBUG=True)
+    def test_no_middleware_is_adapted(self):
+        # In DEBUG, Django logs each middleware it has to wrap for the ASGI
+        # handler.
+        with self.assertLogs('django.request', 'DEBUG') as logs:
+            logging.getLogger('django.request').debug('loaded.')
+            ASGIHandler().load_middleware(is_async=True)
+        self.assertEqual([record for record in logs.output if 'adapted' in record], [])
+
+    async def test_the_views_run_on_the_event_loop(self):
+        response = await self.async_client.get('/thread/')
+        self.assertEqual(response.json()['thread'], threading.get_ident())
+
+    async def test_read_views(self):
+        product = await Product.objects.order_by('id').afirst()
+        response = await self.async_client.get('/market/product/{}/'.format(product.pk))
+        self.assertEqual(response.json()['code'], 'p00000')
+        response = await self.async_client.get('/market/product/list/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(zlib.decompress(response.content, 31).decode().split('"code"')), 21)
+        response = await self.async_client.get('/market/customer/{}/'.format(self.customer.pk))
+        self.assertEqual(response.json()['username'], 'ali')
+        response = await self.async_client.get('/market/customer/profile/')
+        self.assertEqual(response.json()['username'], 'ali')
+        response = await self.async_client.get('/market/shopping/cart/')
+        self.assertEqual(response.status_code, 200)
+
+    async def test_tokens(self):
+        auth = {'Authorization': 'Bearer ' + self.token['token']}
+        self.async_client.cookies.clear()
+        response = await self.async_client.get('/market/customer/profile/', headers=auth)
+        self.assertEqual(response.json()['username'], 'ali')
+        response = await self.async_client.get('/market/customer/profile/', headers={'Authorization': 'Bearer x'})
+        self.assertEqual(response.status_code, 401)
+        revoke_token(verify_token(self.token['token']))
+        response = await self.async_client.get('/market/customer/profile/', headers=auth)
+        self.assertEqual(response.status_code, 401)
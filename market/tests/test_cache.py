@@ -0,0 +1,77 @@
+from django.test import SimpleTestCase, override_settings
+
+from market.cache import product_cache
+from market.checks import check_shared_cache
+from market.models import Product
+from market.testing import MarketTestCase, make_products
+
+
+class ProductCacheTests(MarketTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.logout()
+        make_products(2, inventory=5)
+        self.url = '/market/product/{}/'.format(Product.objects.get(code='p00000').pk)
+
+    def test_reads_are_cached(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_writes_invalidate_on_commit(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.adjust_inventory({'p00000': 3}, field='code')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['inventory'], 8)
+
+    def test_rolled_back_writes_keep_the_version(self):
+        etag = product_cache.etag()
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            with self.assertRaises(ValueError):
+                Product.objects.adjust_inventory({'p00000': -10}, field='code')
+        self.assertEqual(callbacks, [])
+        self.assertEqual(product_cache.etag(), etag)
+
+
+LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+SHARED = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost'}}
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+
+    @override_settings(CACHES=LOCAL, MARKET_WORKERS=2)
+    def test_per_process_cache_with_workers(self):
+        warning, = check_shared_cache(None)
+        self.assertEqual(warning.id, 'market.W001')
+        self.assertIn('product cache', warning.msg)
+        self.assertIn('revoked tokens', warning.msg)
+
+    @override_settings(CACHES=LOCAL, MARKET_WORKERS=1)
+    def test_one_worker(self):
+        self.assertEqual(check_shared_cache(None), [])
+
+    @override_settings(CACHES=SHARED, MARKET_WORKERS=2)
+    def test_shared_cache(self):
+        self.assertEqual(check_shared_cache(None), [])
+
+    @override_settings(CACHES=SHARED, MARKET_WORKERS=2, SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+    def test_sessions_follow_their_own_cache(self):
+        self.assertEqual(check_shared_cache(None), [])
+        with self.settings(CACHES=dict(SHARED, sessions=LOCAL['default']), SESSION_CACHE_ALIAS='sessions'):
+            warning, = check_shared_cache(None)
+        self.assertIn('sessions', warning.msg)
+        self.assertNotIn('product cache', warning.msg)
@@ -0,0 +1,46 @@
+from market.models import Order, Product
+from market.testing import MarketTestCase, make_products
+
+
+class CartTests(MarketTestCase):
+
+    def test_add_items_applies_valid_items_and_reports_the_rest(self):
+        make_products(3, inventory=5)
+        response = self.add([
+            {'code': 'p00000', 'amount': 2},
+            {'code': 'missing', 'amount': 1},
+            {'code': 'p00001', 'amount': 0},
+            {'code': 'p00002', 'amount': 6},
+            {'amount': 1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        data = response.json()
+        self.assertEqual([error['code'] for error in data['errors']], ['missing', 'p00001', 'p00002', None])
+        self.assertEqual([(item['code'], item['amount']) for item in data['items']], [('p00000', 2)])
+        self.assertEqual(data['total_price'], 20)
+
+    def test_remove_items(self):
+        make_products(2)
+        self.add([{'code': 'p00000', 'amount': 3}, {'code': 'p00001', 'amount': 1}])
+        response = self.post('/market/shopping/cart/remove_items/', [
+            {'code': 'p00000', 'amount': 1}, {'code': 'p00001'}, {'code': 'p00001', 'amount': 1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        data = response.json()
+        self.assertEqual([error['code'] for error in data['errors']], ['p00001'])
+        self.assertEqual([(item['code'], item['amount']) for item in data['items']], [('p00000', 2)])
+        self.assertEqual(Order.objects.get(status=1).total_price, 20)
+
+    def test_cart_queries_do_not_grow(self):
+        def grow(size):
+            make_products(size)
+            self.add([{'code': code, 'amount': 1} for code in Product.objects.values_list('code', flat=True)])
+        self.assertQueriesDoNotGrow(lambda: self.client.get('/market/shopping/cart/'), grow)
+
+    def test_add_items_queries_do_not_grow_with_payload(self):
+        payload = []
+
+        def grow(size):
+            make_products(size)
+            payload[:] = [{'code': code, 'amount': 1} for code in Product.objects.values_list('code', flat=True)]
+        self.assertQueriesDoNotGrow(lambda: self.add(payload), grow)
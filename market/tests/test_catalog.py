@@ -0,0 +1,57 @@
+import json
+
+from market.models import Customer
+from market.pagination import encode_cursor
+from market.testing import MarketTestCase, make_customer, make_products
+
+
+class ProductListTests(MarketTestCase):
+
+    def test_pages_follow_the_cursor(self):
+        make_products(5)
+        codes, params = [], {'limit': 2}
+        while True:
+            data = self.client.get('/market/product/list/', params).json()
+            codes += [product['code'] for product in data['products']]
+            if data['next'] is None:
+                break
+            params['cursor'] = data['next']
+        self.assertEqual(codes, ['p{:05d}'.format(number) for number in range(5)])
+
+    def test_bad_cursors_are_rejected(self):
+        make_products(3)
+        for cursor in ({}, [1, 2], 'x', True):
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/market/product/list/', {'limit': 1, 'cursor': encode_cursor(cursor)})
+                self.assertEqual(response.status_code, 400)
+
+    def test_stream(self):
+        make_products(3)
+        response = self.client.get('/market/product/list/', {'format': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['code'] for line in lines], ['p00000', 'p00001', 'p00002'])
+
+    def test_list_queries_do_not_grow(self):
+        for url in ('/market/product/list/', '/market/product/list/?limit=5', '/market/product/list/?format=ndjson'):
+            with self.subTest(url=url):
+                self.assertQueriesDoNotGrow(lambda: list(self.client.get(url)), make_products)
+
+
+class CustomerListTests(MarketTestCase):
+
+    def grow(self, size):
+        for number in range(Customer.objects.count(), size):
+            make_customer('customer{}'.format(number))
+
+    def test_list_queries_do_not_grow(self):
+        for url in ('/market/customer/list/', '/market/customer/list/?limit=5', '/market/customer/list/?search=cust'):
+            with self.subTest(url=url):
+                self.assertQueriesDoNotGrow(lambda: self.client.get(url), self.grow, sizes=(2, 5, 15))
+
+    def test_bad_cursors_are_rejected(self):
+        self.grow(3)
+        for cursor in ({}, [1, 2], 'x', True):
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/market/customer/list/', {'limit': 1, 'cursor': encode_cursor(cursor)})
+                self.assertEqual(response.status_code, 400)
@@ -0,0 +1,59 @@
+from market.models import Customer, Order, Product
+from market.testing import MarketTestCase, make_products
+
+
+class CheckoutTests(MarketTestCase):
+
+    def submit(self):
+        return self.post('/market/shopping/submit/', {})
+
+    def test_submit_charges_and_takes_stock(self):
+        make_products(2, inventory=5, price=100)
+        self.add([{'code': 'p00000', 'amount': 2}, {'code': 'p00001', 'amount': 1}])
+        response = self.submit()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_price'], 300)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.balance, 20000 - 300)
+        self.assertEqual(dict(Product.objects.values_list('code', 'inventory')), {'p00000': 3, 'p00001': 4})
+        self.assertEqual(Order.objects.get().status, Order.STATUS_SUBMITTED)
+
+    def test_submit_over_balance_changes_nothing(self):
+        make_products(1, inventory=5, price=100)
+        Customer.objects.filter(pk=self.customer.pk).update(balance=150)
+        self.add([{'code': 'p00000', 'amount': 2}])
+        self.assertEqual(self.submit().status_code, 400)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.balance, 150)
+        self.assertEqual(Product.objects.get().inventory, 5)
+        self.assertEqual(Order.objects.get().status, Order.STATUS_SHOPPING)
+
+    def test_submit_short_on_stock_changes_nothing(self):
+        make_products(2, inventory=5, price=100)
+        self.add([{'code': 'p00000', 'amount': 1}, {'code': 'p00001', 'amount': 4}])
+        # Someone else bought p00001 meanwhile.
+        Product.objects.filter(code='p00001').update(inventory=3)
+        self.assertEqual(self.submit().status_code, 400)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.balance, 20000)
+        self.assertEqual(dict(Product.objects.values_list('code', 'inventory')), {'p00000': 5, 'p00001': 3})
+        self.assertEqual(Order.objects.get().status, Order.STATUS_SHOPPING)
+
+    def test_cancel_gives_back_stock_and_money(self):
+        make_products(1, inventory=5, price=100)
+        self.add([{'code': 'p00000', 'amount': 2}])
+        self.submit()
+        order = Order.objects.get()
+        order.cancel()
+        with self.assertRaises(ValueError):
+            order.cancel()
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.balance, 20000)
+        self.assertEqual(Product.objects.get().inventory, 5)
+        self.assertEqual(Order.objects.get().status, Order.STATUS_CANCELED)
+
+    def test_submit_queries_do_not_grow(self):
+        def grow(size):
+            make_products(size)
+            self.add([{'code': code, 'amount': 1} for code in Product.objects.values_list('code', flat=True)])
+        self.assertQueriesDoNotGrow(self.submit, grow)
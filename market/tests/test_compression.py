@@ -0,0 +1,71 @@
+import json
+import zlib
+
+from django.test import SimpleTestCase, override_settings
+
+from market.compression import Compressor, available, negotiate
+from market.models import Product
+from market.testing import MarketTestCase, make_products
+
+
+def gunzip(data):
+    return zlib.decompress(data, 31)
+
+
+class NegotiateTests(SimpleTestCase):
+
+    def test_preference_and_weights(self):
+        best = available()[0]
+        self.assertEqual(negotiate('gzip'), 'gzip')
+        self.assertEqual(negotiate('gzip, deflate, br'), best)
+        self.assertEqual(negotiate('*'), best)
+        self.assertEqual(negotiate('gzip;q=0, *;q=0.5'), best if best != 'gzip' else None)
+        self.assertIsNone(negotiate('identity'))
+        self.assertIsNone(negotiate('gzip;q=x'))
+        self.assertIsNone(negotiate(''))
+
+
+class CompressorTests(SimpleTestCase):
+
+    def test_whole_and_streamed_gzip(self):
+        chunks = [json.dumps({'n': number}).encode() + b'\n' for number in range(20000)]
+        self.assertEqual(gunzip(Compressor('gzip').whole(b''.join(chunks))), b''.join(chunks))
+        streamed = list(Compressor('gzip').stream(iter(chunks)))
+        self.assertGreater(len(streamed), 2)
+        self.assertEqual(gunzip(b''.join(streamed)), b''.join(chunks))
+
+
+@override_settings(MARKET_COMPRESS_MIN_SIZE=200)
+class CompressionMiddlewareTests(MarketTestCase):
+
+    def test_large_responses_are_compressed(self):
+        make_products(20)
+        plain = self.client.get('/market/product/list/')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        response = self.client.get('/market/product/list/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(gunzip(response.content), plain.content)
+
+    def test_small_responses_are_not(self):
+        make_products(1)
+        response = self.client.get('/market/product/{}/'.format(Product.objects.get().pk), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_streams_are_compressed(self):
+        make_products(3)
+        response = self.client.get('/market/product/list/', {'format': 'ndjson'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', response)
+        lines = gunzip(b''.join(response.streaming_content)).splitlines()
+        self.assertEqual([json.loads(line)['code'] for line in lines], ['p00000', 'p00001', 'p00002'])
+
+    def test_columns_format(self):
+        make_products(3)
+        expected = list(Product.objects.order_by('id').values('id', 'code', 'name', 'price', 'inventory'))
+        for url in ('/market/product/list/', '/market/product/list/?limit=10'):
+            with self.subTest(url=url):
+                columns = self.client.get(url, {'format': 'columns'}).json()['products']
+                self.assertEqual(columns['fields'], ['id', 'code', 'name', 'price', 'inventory'])
+                self.assertEqual([dict(zip(columns['fields'], row)) for row in zip(*columns['columns'])], expected)
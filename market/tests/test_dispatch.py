@@ -0,0 +1,75 @@
+import datetime
+import io
+import json
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from market.dispatch import DispatchQueue
+from market.models import Order
+from market.testing import MarketTestCase
+
+
+class DispatchTests(MarketTestCase):
+
+    def setUp(self):
+        super().setUp()
+        Order.objects.bulk_create([Order(customer=self.customer, status=Order.STATUS_SUBMITTED) for _ in range(5)])
+        Order.objects.create(customer=self.customer, status=Order.STATUS_SHOPPING)
+        self.ids = list(Order.objects.filter(status=Order.STATUS_SUBMITTED).order_by('id').values_list('id', flat=True))
+
+    def test_workers_never_share_orders(self):
+        first, second = DispatchQueue('first'), DispatchQueue('second')
+        self.assertEqual(first.claim(3), self.ids[:3])
+        self.assertEqual(second.claim(3), self.ids[3:])
+        self.assertEqual(first.claim(3), [])
+        self.assertEqual(second.complete(self.ids), 2)
+        self.assertEqual(first.complete(self.ids), 3)
+        self.assertEqual(Order.objects.filter(status=Order.STATUS_SENT).count(), 5)
+        self.assertFalse(Order.objects.filter(claimed_by__isnull=False).exists())
+
+    def test_expired_claims_are_taken_over(self):
+        dead = DispatchQueue('dead', lease=60)
+        dead.claim(2)
+        Order.objects.filter(claimed_by='dead').update(claimed_at=timezone.now() - datetime.timedelta(seconds=61))
+        live = DispatchQueue('live', lease=60)
+        self.assertEqual(live.claim(10), self.ids)
+        # The dead worker's late completion no longer counts.
+        self.assertEqual(dead.complete(self.ids[:2]), 0)
+
+    def test_canceled_orders_are_not_sent(self):
+        queue = DispatchQueue('worker')
+        ids = queue.claim(10)
+        Order.objects.filter(pk=ids[0]).update(status=Order.STATUS_CANCELED)
+        self.assertEqual(queue.complete(ids), 4)
+        self.assertEqual(Order.objects.get(pk=ids[0]).status, Order.STATUS_CANCELED)
+
+    def test_failed_batches_are_released(self):
+        queue = DispatchQueue('worker')
+
+        def handle(ids):
+            raise RuntimeError('printer on fire')
+        report = queue.report()
+        with self.assertRaises(RuntimeError):
+            queue.drain(2, handle, report=report)
+        self.assertEqual((report['batches'], report['claimed'], report['sent']), (1, 2, 0))
+        self.assertFalse(Order.objects.filter(claimed_by__isnull=False).exists())
+        self.assertEqual(queue.depth(), 5)
+
+    def test_drain(self):
+        handled = []
+        report = DispatchQueue('worker').drain(2, handled.append)
+        self.assertEqual(handled, [self.ids[:2], self.ids[2:4], self.ids[4:]])
+        self.assertEqual((report['batches'], report['claimed'], report['sent']), (3, 5, 5))
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('dispatch_orders', batch_size=2, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual((report['queue_depth_before'], report['queue_depth_after'], report['sent']), (5, 0, 5))
+
+    def test_metrics_gauges(self):
+        DispatchQueue('worker').claim(2)
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('market_dispatch_queue_depth 5\n', body)
+        self.assertIn('market_dispatch_claimed 2\n', body)
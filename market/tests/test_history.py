@@ -0,0 +1,99 @@
+import datetime
+
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from market.models import Order
+from market.pagination import encode_cursor
+from market.testing import MarketTestCase, make_products
+
+
+class OrderHistoryTests(MarketTestCase):
+
+    def make_orders(self, count, status=Order.STATUS_SENT):
+        now = timezone.now()
+        for number in range(count):
+            order = Order.objects.create(customer=self.customer, status=status)
+            # Whole minutes apart, two orders per minute to tie on order_time.
+            Order.objects.filter(pk=order.pk).update(order_time=now - datetime.timedelta(minutes=number // 2))
+
+    def test_pages_are_newest_first(self):
+        self.make_orders(5)
+        ids, params = [], {'limit': 2}
+        while True:
+            data = self.client.get('/market/shopping/orders/', params).json()
+            ids += [order['id'] for order in data['orders']]
+            if data['next'] is None:
+                break
+            params['cursor'] = data['next']
+        expected = list(Order.objects.order_by('-order_time', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_status_filter(self):
+        self.make_orders(2)
+        self.make_orders(1, status=Order.STATUS_CANCELED)
+        for status in ('canceled', '3'):
+            data = self.client.get('/market/shopping/orders/', {'status': status}).json()
+            self.assertEqual([order['status'] for order in data['orders']], ['canceled'])
+        self.assertEqual(self.client.get('/market/shopping/orders/', {'status': 'lost'}).status_code, 400)
+
+    def test_bad_cursors_are_rejected(self):
+        self.make_orders(2)
+        for cursor in (5, [1], [{}, 1]):
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/market/shopping/orders/', {'limit': 1, 'cursor': encode_cursor(cursor)})
+                self.assertEqual(response.status_code, 400)
+
+    def test_order_history_queries_do_not_grow(self):
+        def grow(size):
+            while Order.objects.count() < size:
+                Order.objects.create(customer=self.customer, status=Order.STATUS_SENT)
+        self.assertQueriesDoNotGrow(lambda: self.client.get('/market/shopping/orders/'), grow)
+
+    def test_one_open_cart_per_customer(self):
+        Order.initiate(self.customer)
+        with self.assertRaises(ValueError):
+            Order.initiate(self.customer)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Order.objects.create(customer=self.customer, status=Order.STATUS_SHOPPING)
+
+
+class OpenCartMigrationTests(TransactionTestCase):
+    # Carts that existed before the one-open-cart constraint.
+
+    before = [('market', '0004_order_row_snapshots')]
+    after = [('market', '0005_order_history_and_open_cart')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicate_carts_are_merged_into_the_newest(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        make = apps.get_model('market', 'Product').objects.create
+        apple, bread = make(code='a', name='apple', price=2), make(code='b', name='bread', price=5)
+        User = apps.get_model('auth', 'User')
+        customer = apps.get_model('market', 'Customer').objects.create(
+            user=User.objects.create(username='ali'), phone='1', address='Tehran',
+        )
+        Order = apps.get_model('market', 'Order')
+        OrderRow = apps.get_model('market', 'OrderRow')
+        carts = [Order.objects.create(customer=customer, status=1) for _ in range(3)]
+        Order.objects.create(customer=customer, status=2)
+        for cart, product, amount in ((carts[0], apple, 2), (carts[0], bread, 1), (carts[2], apple, 1)):
+            OrderRow.objects.create(order=cart, product=product, amount=amount, unit_price=product.price)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        apps = executor.loader.project_state(self.after).apps
+        Order = apps.get_model('market', 'Order')
+        cart = Order.objects.get(status=1)
+        self.assertEqual(cart.pk, carts[2].pk)
+        self.assertEqual(cart.total_price, 3 * 2 + 1 * 5)
+        rows = apps.get_model('market', 'OrderRow').objects.filter(order=cart)
+        self.assertEqual(dict(rows.values_list('product__code', 'amount')), {'a': 3, 'b': 1})
+        self.assertEqual(Order.objects.count(), 2)
@@ -0,0 +1,78 @@
+import io
+import json
+
+from django.test import SimpleTestCase
+
+from market.importer import iter_json_array
+from market.models import Product
+from market.testing import MarketTestCase, make_products
+
+
+class JsonArrayTests(SimpleTestCase):
+
+    def parse(self, text, chunk_size):
+        return list(iter_json_array(io.StringIO(text), chunk_size=chunk_size))
+
+    def test_any_chunk_size(self):
+        items = [1.5, -2e-3, 12345, 0.25e+10, {'a': [1, 'x,]'], 'b': None}, 'text', True]
+        text = json.dumps(items)
+        for chunk_size in range(1, len(text) + 1):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(self.parse(text, chunk_size), items)
+
+    def test_whitespace_and_empty_arrays(self):
+        for chunk_size in (1, 2, 3, 1024):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(self.parse(' [ 1 ,\n 2.0 ] ', chunk_size), [1, 2.0])
+                self.assertEqual(self.parse('[ ]', chunk_size), [])
+
+    def test_malformed(self):
+        for text in ('[1.x]', '[1 2]', '[1,', '[1.]', '[tru]'):
+            for chunk_size in (1, 2, 1024):
+                with self.subTest(text=text, chunk_size=chunk_size):
+                    with self.assertRaisesMessage(ValueError, 'malformed JSON array.'):
+                        self.parse(text, chunk_size)
+        with self.assertRaisesMessage(ValueError, 'expected a JSON array.'):
+            self.parse('{}', 1)
+
+
+class ImportTests(MarketTestCase):
+
+    def upload(self, body, content_type):
+        return self.client.post('/market/product/import/', body, content_type=content_type)
+
+    def test_json_upserts_on_code(self):
+        make_products(1, inventory=7)
+        response = self.upload(json.dumps([
+            {'code': 'p00000', 'name': 'renamed', 'price': 99},
+            {'code': 'new', 'name': 'new product', 'price': 5, 'inventory': 3},
+        ]), 'application/json')
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual((report['rows'], report['created'], report['updated'], report['failed']), (2, 1, 1, 0))
+        self.assertEqual(
+            list(Product.objects.order_by('code').values_list('code', 'name', 'price', 'inventory')),
+            [('new', 'new product', 5, 3), ('p00000', 'renamed', 99, 7)],
+        )
+
+    def test_bad_rows_are_reported_and_the_rest_loaded(self):
+        body = '\n'.join([
+            json.dumps({'code': 'a', 'name': 'a', 'price': 1}),
+            '{not json',
+            json.dumps({'code': 'b', 'price': 1}),
+            json.dumps({'code': 'c', 'name': 'c', 'price': -1}),
+            json.dumps({'code': 'd', 'name': 'd', 'price': 2}),
+        ])
+        response = self.upload(body, 'application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        report = response.json()
+        self.assertEqual([(error['row'], error['code']) for error in report['errors']], [(2, None), (3, 'b'), (4, 'c')])
+        self.assertEqual(sorted(Product.objects.values_list('code', flat=True)), ['a', 'd'])
+
+    def test_csv(self):
+        response = self.upload('code,name,price,inventory\nx,cheese,12,4\ny,bread,3,\n', 'text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(dict(Product.objects.values_list('code', 'inventory')), {'x': 4, 'y': 0})
+
+    def test_unknown_format(self):
+        self.assertEqual(self.upload('x', 'text/plain').status_code, 400)
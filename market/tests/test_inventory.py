@@ -0,0 +1,44 @@
+from market.models import Product
+from market.testing import MarketTestCase, make_products
+
+
+class InventoryTests(MarketTestCase):
+
+    def test_inventory_edit_never_goes_negative(self):
+        make_products(2, inventory=5)
+        response = self.post('/market/product/inventory/', {'p00000': 3, 'p00001': -6})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['code'] for error in response.json()['errors']], ['p00001'])
+        self.assertEqual(dict(Product.objects.values_list('code', 'inventory')), {'p00000': 5, 'p00001': 5})
+
+    def test_inventory_edit(self):
+        make_products(2, inventory=5)
+        response = self.post('/market/product/inventory/', {'p00000': 3, 'p00001': -5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(dict(Product.objects.values_list('code', 'inventory')), {'p00000': 8, 'p00001': 0})
+
+    def test_negative_stock_can_be_restocked(self):
+        make_products(2, inventory=5)
+        Product.objects.filter(code='p00000').update(inventory=-5)
+        response = self.post('/market/product/inventory/', {'p00000': 3, 'p00001': -1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(dict(Product.objects.values_list('code', 'inventory')), {'p00000': -2, 'p00001': 4})
+        Product.objects.get(code='p00000').increase_inventory(10)
+        with self.assertRaises(ValueError):
+            Product.objects.get(code='p00001').decrease_inventory(5)
+        self.assertEqual(dict(Product.objects.values_list('code', 'inventory')), {'p00000': 8, 'p00001': 4})
+
+    def test_unknown_codes_change_nothing(self):
+        make_products(1, inventory=5)
+        response = self.post('/market/product/inventory/', {'p00000': 1, 'missing': 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [{'code': 'missing', 'message': 'Product matching query does not exist.'}])
+        self.assertEqual(Product.objects.get().inventory, 5)
+
+    def test_batches(self):
+        make_products(7, inventory=5)
+        with self.settings(MARKET_INVENTORY_BATCH_SIZE=3):
+            with self.assertNumQueries(5):
+                # Three UPDATEs in a savepoint.
+                Product.objects.adjust_inventory({'p{:05d}'.format(number): -1 for number in range(7)}, field='code')
+        self.assertEqual(set(Product.objects.values_list('inventory', flat=True)), {4})
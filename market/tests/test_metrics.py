@@ -0,0 +1,53 @@
+import asyncio
+from unittest import mock
+
+from django.test import TransactionTestCase, override_settings
+
+from market.async_views import run_in_pool
+from market.metrics import Registry, timed_queries
+from market.models import Product
+from market.testing import MarketTestCase, make_customer, make_products
+
+
+class RegistryTests(MarketTestCase):
+
+    def test_requests_are_recorded_per_view(self):
+        make_products(3)
+        with mock.patch('market.middleware.registry', Registry()) as registry:
+            self.client.get('/market/product/list/')
+            self.client.post('/market/product/list/')
+        self.assertEqual(registry.totals()[0], 2)
+        body = registry.render()
+        self.assertIn('market_http_responses_total{view="product_show",method="GET",status="200"} 1\n', body)
+        self.assertIn('market_http_responses_total{view="product_show",method="POST",status="400"} 1\n', body)
+        self.assertIn('market_db_queries_per_request_count{view="product_show"} 2\n', body)
+
+    def test_endpoint(self):
+        self.client.get('/market/customer/profile/')
+        response = self.client.get('/metrics')
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('market_http_responses_total{view="customer_profile",method="GET",status="200"}', response.content.decode())
+
+
+# Transactions so that the pool threads see the rows.
+@override_settings(ROOT_URLCONF='market.tests.test_async')
+class PoolQueryTests(TransactionTestCase):
+
+    def setUp(self):
+        make_customer('ali')
+        make_products(3)
+
+    async def test_queries_on_the_pool_are_counted(self):
+        with timed_queries() as queries:
+            counts = await asyncio.gather(*(run_in_pool(Product.objects.count) for _ in range(4)))
+        self.assertEqual(counts, [3] * 4)
+        self.assertEqual(queries.count, 4)
+        # Nothing is counted outside the block.
+        await run_in_pool(Product.objects.count)
+        self.assertEqual(queries.count, 4)
+
+    async def test_async_views_are_counted(self):
+        with mock.patch('market.middleware.registry', Registry()) as registry:
+            response = await self.async_client.get('/market/customer/list/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(registry.totals(), (1, 1))
@@ -0,0 +1,83 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import path
+
+from market.async_views import run_in_pool
+from market.models import Product
+from market.querycheck import normalize, record_queries
+from market.testing import MarketTestCase, assert_queries_do_not_grow, make_products
+
+
+class NormalizeTests(SimpleTestCase):
+
+    def test_literals_and_lists_collapse(self):
+        self.assertEqual(
+            normalize("SELECT * FROM t WHERE a = 'x''y' AND b = 12.5 AND c IN (%s, %s,%s)"),
+            'SELECT * FROM t WHERE a = ? AND b = ? AND c IN (...)',
+        )
+        self.assertEqual(normalize('SELECT  1\n  FROM t'), normalize('SELECT 2 FROM t'))
+
+
+class RecorderTests(MarketTestCase):
+
+    def test_repeated_shapes_are_reported_with_their_call_site(self):
+        make_products(4)
+        with record_queries(threshold=2) as recorder:
+            for pk in Product.objects.values_list('pk', flat=True):
+                Product.objects.get(pk=pk)
+            Product.objects.get(pk=1)
+        (count, shape, site), = recorder.repeated()
+        self.assertEqual(count, 5)
+        self.assertIn('FROM "market_product"', shape)
+        self.assertIn('test_querycheck.py', site)
+        self.assertEqual(recorder.count, 6)
+        self.assertEqual(recorder.duplicates(), 1)
+
+    def test_growing_query_counts_fail(self):
+        def per_product():
+            for product in Product.objects.all():
+                Product.objects.filter(pk=product.pk).exists()
+        with self.assertRaisesMessage(AssertionError, 'query count grows with data size'):
+            assert_queries_do_not_grow(per_product, make_products, sizes=(1, 5))
+
+
+def product_names(request):
+    # One query per product.
+    return JsonResponse({'names': [Product.objects.get(pk=pk).name for pk in Product.objects.values_list('pk', flat=True)]})
+
+
+async def pool_names(request):
+    return await run_in_pool(product_names, request)
+
+
+urlpatterns = [
+    path('names/', product_names, name='product_names'),
+    path('pool/names/', pool_names, name='pool_names'),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__, MARKET_QUERY_CHECK=True, MARKET_QUERY_CHECK_THRESHOLD=3)
+class MiddlewareTests(MarketTestCase):
+
+    def test_header_names_the_worst_shape(self):
+        make_products(5)
+        with self.assertLogs('market.querycheck', 'WARNING') as logs:
+            response = self.client.get('/names/')
+        self.assertRegex(response['X-Query-Check'], r'^1 repeated shapes; worst 5x at .*test_querycheck\.py')
+        self.assertIn('repeated queries in product_names', logs.output[0])
+
+    def test_quiet_below_the_threshold(self):
+        make_products(3)
+        self.assertNotIn('X-Query-Check', self.client.get('/names/'))
+
+
+# Transactions so that the pool threads see the rows.
+@override_settings(ROOT_URLCONF=__name__, MARKET_QUERY_CHECK=True, MARKET_QUERY_CHECK_THRESHOLD=3)
+class PoolTests(TransactionTestCase):
+
+    async def test_queries_on_the_pool_are_checked(self):
+        await sync_to_async(make_products)(5)
+        with self.assertLogs('market.querycheck', 'WARNING'):
+            response = await self.async_client.get('/pool/names/')
+        self.assertRegex(response['X-Query-Check'], r'^1 repeated shapes; worst 5x at .*test_querycheck\.py')
@@ -0,0 +1,68 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TransactionTestCase, override_settings
+
+from market.routers import PRIMARY_COOKIE
+from market.testing import make_customer, make_products
+from market.tokens import issue_token
+
+
+# Transactions, because reads inside an atomic block always stay on the
+# primary.
+class ReadYourWritesTests(TransactionTestCase):
+
+    def setUp(self):
+        caches[settings.MARKET_CACHE_ALIAS].clear()
+        self.customer = make_customer('ali')
+        make_products(3)
+        # Replica reads go to the primary's alias; only while the test runs,
+        # since replicas are not flushed afterwards.
+        self.enterContext(override_settings(MARKET_REPLICAS=['default']))
+
+    def auth(self, customer):
+        return {'HTTP_AUTHORIZATION': 'Bearer ' + issue_token(customer.user, customer.pk)['token']}
+
+    def from_replica(self, **extra):
+        # Bodies read from a replica drop the primary's ETag.
+        response = self.client.get('/market/product/list/', **extra)
+        self.assertEqual(response.status_code, 200)
+        return 'ETag' not in response
+
+    def add(self, **extra):
+        response = self.client.post('/market/shopping/cart/add_items/', json.dumps([{'code': 'p00000', 'amount': 1}]),
+                                    content_type='application/json', **extra)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_reads_use_the_replica(self):
+        self.assertTrue(self.from_replica())
+        self.assertTrue(self.from_replica(**self.auth(self.customer)))
+
+    def test_session_clients_stay_on_the_primary_after_a_write(self):
+        self.client.login(username='ali', password='secret')
+        response = self.add()
+        self.assertEqual(response.cookies[PRIMARY_COOKIE]['max-age'], settings.MARKET_REPLICA_LAG)
+        self.assertFalse(self.from_replica())
+
+    def test_token_clients_stay_on_the_primary_after_a_write(self):
+        auth = self.auth(self.customer)
+        self.add(**auth)
+        self.client.cookies.clear()
+        self.assertFalse(self.from_replica(**auth))
+        # Any token of the same user, but nobody else.
+        self.assertFalse(self.from_replica(**self.auth(self.customer)))
+        self.assertTrue(self.from_replica(**self.auth(make_customer('sara'))))
+        caches[settings.MARKET_CACHE_ALIAS].clear()
+        self.assertTrue(self.from_replica(**auth))
+
+    async def test_async_views(self):
+        token = issue_token(self.customer.user, self.customer.pk)['token']
+        await sync_to_async(self.add)(HTTP_AUTHORIZATION='Bearer ' + token)
+        with override_settings(ROOT_URLCONF='market.tests.test_async'):
+            response = await self.async_client.get('/market/product/list/', headers={'Authorization': 'Bearer ' + token})
+            self.assertIn('ETag', response)
+            response = await self.async_client.get('/market/product/list/')
+            self.assertNotIn('ETag', response)
@@ -0,0 +1,82 @@
+import datetime
+import io
+
+from django.conf import settings
+from django.core.management import call_command
+from django.utils import timezone
+
+from market.models import CustomerDailySales, Order, ProductDailySales
+from market.testing import MarketTestCase, make_customer, make_products
+
+
+class SalesTests(MarketTestCase):
+
+    def setUp(self):
+        super().setUp()
+        make_products(3, inventory=100, price=10)
+
+    def checkout(self, items, login='ali'):
+        self.client.login(username=login, password='secret')
+        self.add([{'code': code, 'amount': amount} for code, amount in items])
+        self.assertEqual(self.post('/market/shopping/submit/', {}).status_code, 200)
+        return Order.objects.filter(customer__user__username=login).latest('id')
+
+    def rollups(self):
+        return (
+            sorted(ProductDailySales.objects.values_list('product__code', 'day', 'units', 'revenue', 'orders')),
+            sorted(CustomerDailySales.objects.values_list('customer__user__username', 'day', 'revenue', 'orders')),
+        )
+
+    def test_submit_and_cancel_keep_the_rollups(self):
+        make_customer('sara')
+        today = timezone.localdate()
+        self.checkout([('p00000', 2), ('p00001', 1)])
+        order = self.checkout([('p00000', 1)], login='sara')
+        self.assertEqual(self.rollups(), (
+            [('p00000', today, 3, 30, 2), ('p00001', today, 1, 10, 1)],
+            [('ali', today, 30, 1), ('sara', today, 10, 1)],
+        ))
+        order.cancel()
+        self.assertEqual(self.rollups(), (
+            [('p00000', today, 2, 20, 1), ('p00001', today, 1, 10, 1)],
+            [('ali', today, 30, 1), ('sara', today, 0, 0)],
+        ))
+
+    def test_sales_count_on_the_day_of_submission(self):
+        self.add([{'code': 'p00000', 'amount': 1}])
+        Order.objects.update(order_time=timezone.now() - datetime.timedelta(days=3))
+        order = self.checkout([])
+        self.assertEqual(timezone.localdate(order.submitted_at), timezone.localdate())
+        self.assertEqual(ProductDailySales.objects.get().day, timezone.localdate())
+        response = self.client.get('/market/sales/products/')
+        self.assertEqual(response.json()['products'], [
+            {'code': 'p00000', 'name': 'product 0', 'units': 1, 'revenue': 10, 'orders': 1},
+        ])
+
+    def test_rebuild_matches_the_running_sums(self):
+        make_customer('sara')
+        self.checkout([('p00000', 2), ('p00002', 3)])
+        self.checkout([('p00000', 1), ('p00001', 4)], login='sara').cancel()
+        self.checkout([('p00001', 1)], login='sara')
+        running = self.rollups()
+        ProductDailySales.objects.all().delete()
+        CustomerDailySales.objects.all().delete()
+        call_command('rebuild_sales_rollups', stdout=io.StringIO())
+        # The rebuild has no rows for sums that were taken back to zero.
+        self.assertEqual(self.rollups(), (
+            [row for row in running[0] if row[2:] != (0, 0, 0)],
+            running[1],
+        ))
+
+    def test_daily_series(self):
+        self.checkout([('p00000', 2)])
+        self.checkout([('p00000', 1)])
+        days = self.client.get('/market/sales/daily/', {'code': 'p00000'}).json()['days']
+        self.assertEqual(days, [{'day': str(timezone.localdate()), 'units': 3, 'revenue': 30, 'orders': 2}])
+
+    def test_sales_report_limits(self):
+        for url in ('/market/sales/products/', '/market/sales/customers/'):
+            for limit in ('-1', '0', str(settings.MARKET_MAX_PAGE_SIZE + 1), 'x'):
+                with self.subTest(url=url, limit=limit):
+                    self.assertEqual(self.client.get(url, {'limit': limit}).status_code, 400)
+            self.assertEqual(self.client.get(url, {'limit': '1'}).status_code, 200)
@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+
+from django.db import connection
+from django.test import TransactionTestCase
+
+from market import search
+from market.models import Customer, Product
+from market.testing import MarketTestCase, make_customer
+
+
+class ProductSearchTests(MarketTestCase):
+
+    def setUp(self):
+        super().setUp()
+        Product.objects.bulk_create([
+            Product(code='a', name='Apple pie', price=1),
+            Product(code='b', name='Pineapple juice', price=1),
+            Product(code='c', name='Bread', price=1),
+        ])
+
+    def codes(self, keyword):
+        response = self.client.get('/market/product/list/', {'search': keyword})
+        self.assertEqual(response.status_code, 200)
+        return sorted(product['code'] for product in response.json()['products'])
+
+    def test_backend_for_the_database(self):
+        self.assertIsInstance(search.get_backend(), search.SQLiteFTSBackend)
+
+    def test_substring_matches_like_icontains(self):
+        contains = search.ContainsBackend()
+        for keyword in ('APPLE', 'pie', 'ea', 'juice', 'x', 'apple pie', '"'):
+            with self.subTest(keyword=keyword):
+                expected = contains.filter(Product.objects.all(), search.PRODUCT_INDEX, keyword)
+                self.assertEqual(self.codes(keyword), sorted(expected.values_list('code', flat=True)))
+
+    def test_index_follows_writes(self):
+        Product.objects.filter(code='c').update(name='Apple bread')
+        Product.objects.filter(code='b').delete()
+        self.assertEqual(self.codes('apple'), ['a', 'c'])
+        self.assertEqual(self.codes('juice'), [])
+
+    def test_search_is_limited(self):
+        products = Product.get_json.product_search_result('apple', limit=1)['products']
+        self.assertEqual(len(products), 1)
+
+
+class IndexMigrationTests(TransactionTestCase):
+    # FTS5 keeps state outside the transaction, so dropping and creating the
+    # index has to be committed rather than rolled back.
+
+    def test_unapplying_drops_the_index_and_applying_rebuilds_it(self):
+        Product.objects.create(code='a', name='Apple pie', price=1)
+        operation = search.index_operation(search.PRODUCT_INDEX)
+        editor = SimpleNamespace(connection=connection)
+        operation.reverse_code(None, editor)
+        self.assertNotIn('market_product_fts', connection.introspection.table_names())
+        # Without the triggers, writes no longer reach the index.
+        Product.objects.create(code='b', name='Apple tart', price=1)
+        operation.code(None, editor)
+        backend = search.get_backend()
+        found = backend.filter(Product.objects.all(), search.PRODUCT_INDEX, 'apple')
+        self.assertEqual(sorted(found.values_list('code', flat=True)), ['a', 'b'])
+
+class CustomerSearchTests(MarketTestCase):
+
+    def setUp(self):
+        super().setUp()
+        customer = make_customer('sara')
+        customer.user.first_name, customer.user.last_name = 'Sara', 'Karimi'
+        customer.user.save()
+        customer.address = 'Shiraz, Zand street'
+        customer.save()
+
+    def usernames(self, keyword):
+        response = self.client.get('/market/customer/list/', {'search': keyword})
+        self.assertEqual(response.status_code, 200)
+        return sorted(customer['username'] for customer in response.json()['customers'])
+
+    def test_document_covers_user_and_address(self):
+        self.assertEqual(Customer.objects.get(user__username='sara').search_document, 'sara Sara Karimi Shiraz, Zand street')
+        for keyword in ('sara', 'KARIMI', 'zand', 'tehran'):
+            with self.subTest(keyword=keyword):
+                contains = search.ContainsBackend().filter(Customer.objects.all(), search.CUSTOMER_INDEX, keyword)
+                self.assertEqual(self.usernames(keyword), sorted(contains.values_list('user__username', flat=True)))
+
+    def test_renames_reach_the_index(self):
+        customer = Customer.objects.get(user__username='sara')
+        customer.user.last_name = 'Rahimi'
+        customer.user.save(update_fields=['last_name'])
+        self.assertEqual(self.usernames('karimi'), [])
+        self.assertEqual(self.usernames('rahimi'), ['sara'])
+        Customer.objects.filter(pk=customer.pk).update(address='Tabriz')
+        Customer.refresh_search_documents()
+        self.assertEqual(self.usernames('zand'), [])
+        self.assertEqual(self.usernames('tabriz'), ['sara'])
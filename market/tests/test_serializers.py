@@ -0,0 +1,84 @@
+import datetime
+import json
+import unittest
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+
+from market import serializers
+from market.models import Customer, Product
+from market.serializers import JsonResponse, Serializer
+from market.testing import MarketTestCase, make_products
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def upper_dumps(data):
+    return json.dumps(data).upper().encode('utf-8')
+
+
+class SerializerTests(MarketTestCase):
+
+    serializer = Serializer('id', ('label', 'name'), 'price')
+
+    def test_rows_and_columns(self):
+        make_products(2, price=7)
+        queryset = Product.objects.order_by('id')
+        ids = list(queryset.values_list('id', flat=True))
+        self.assertEqual(self.serializer.many(queryset), [
+            {'id': ids[0], 'label': 'product 0', 'price': 7},
+            {'id': ids[1], 'label': 'product 1', 'price': 7},
+        ])
+        self.assertEqual(self.serializer.many(queryset, columns=True), {
+            'fields': ['id', 'label', 'price'],
+            'columns': [ids, ['product 0', 'product 1'], [7, 7]],
+        })
+        self.assertEqual(self.serializer.many(queryset.none(), columns=True), {
+            'fields': ['id', 'label', 'price'], 'columns': [[], [], []],
+        })
+        self.assertEqual(self.serializer.one(queryset.filter(pk=ids[1])), {'id': ids[1], 'label': 'product 1', 'price': 7})
+        self.assertIsNone(self.serializer.one(queryset.none()))
+
+    def test_related_lookups_run_one_query(self):
+        with self.assertNumQueries(1):
+            customers = Customer.get_json.list_result()['customers']
+        self.assertEqual(customers[0]['username'], 'ali')
+
+    def test_responses_match_the_model_fields(self):
+        make_products(3)
+        expected = list(Product.objects.order_by('id').values('id', 'code', 'name', 'price', 'inventory'))
+        self.assertEqual(self.client.get('/market/product/list/').json()['products'], expected)
+
+
+class JsonResponseTests(SimpleTestCase):
+
+    def test_encodes_like_django(self):
+        data = {'day': datetime.date(2024, 5, 1), 'price': 3}
+        self.assertEqual(json.loads(JsonResponse(data).content), {'day': '2024-05-01', 'price': 3})
+        self.assertEqual(JsonResponse(data)['Content-Type'], 'application/json')
+
+    def test_arguments(self):
+        with self.assertRaises(TypeError):
+            JsonResponse([1])
+        self.assertEqual(JsonResponse([1], safe=False).content, b'[1]')
+        self.assertEqual(JsonResponse({'a': 1}, json_dumps_params={'indent': 1}).content, b'{\n "a": 1\n}')
+        self.assertEqual(JsonResponse({'a': 1}, status=201).status_code, 201)
+
+    @override_settings(MARKET_JSON_ENCODER='market.tests.test_serializers.upper_dumps')
+    def test_configured_encoder(self):
+        self.assertEqual(JsonResponse({'a': 'b'}).content, b'{"A": "B"}')
+        self.assertEqual(serializers.ndjson_line({'a': 'b'}), b'{"A": "B"}\n')
+
+    @override_settings(MARKET_JSON_ENCODER='market.tests.missing_dumps')
+    def test_unusable_encoder(self):
+        with self.assertRaises(ImproperlyConfigured):
+            JsonResponse({})
+
+    @unittest.skipIf(orjson is None, 'orjson is not installed')
+    @override_settings(MARKET_JSON_ENCODER='market.serializers.orjson_dumps')
+    def test_orjson_decodes_like_the_stdlib(self):
+        data = {'when': datetime.datetime(2024, 5, 1, 12, 30), 'text': 'ü', 'n': [1, 2.5, None]}
+        self.assertEqual(json.loads(JsonResponse(data).content), json.loads(serializers.stdlib_dumps(data)))
@@ -0,0 +1,84 @@
+import datetime
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from market.management.commands.sweep_carts import Command
+from market.models import Customer, Order, OrderRow, Product
+from market.testing import MarketTestCase, make_customer, make_products
+
+
+class SweeperTests(MarketTestCase):
+
+    def setUp(self):
+        super().setUp()
+        make_products(2, price=4)
+        self.add([{'code': 'p00000', 'amount': 2}, {'code': 'p00001', 'amount': 1}])
+        self.idle = Order.objects.get()
+        Order.objects.filter(pk=self.idle.pk).update(last_activity=timezone.now() - datetime.timedelta(days=30))
+        # A fresh cart and an old submitted order stay.
+        self.fresh = Order.objects.create(customer=make_customer('sara'), status=Order.STATUS_SHOPPING)
+        self.submitted = Order.objects.create(customer=make_customer('reza'), status=Order.STATUS_SUBMITTED)
+        Order.objects.filter(pk=self.submitted.pk).update(last_activity=timezone.now() - datetime.timedelta(days=30))
+
+    def sweep(self, **options):
+        out = io.StringIO()
+        call_command('sweep_carts', sleep=0, stdout=out, **options)
+        return json.loads(out.getvalue())
+
+    def test_idle_carts_are_deleted_with_their_rows(self):
+        report = self.sweep(ttl=24 * 3600)
+        self.assertEqual((report['idle_carts'], report['carts'], report['rows']), (1, 1, 2))
+        self.assertEqual(set(Order.objects.values_list('pk', flat=True)), {self.fresh.pk, self.submitted.pk})
+        self.assertFalse(OrderRow.objects.exists())
+        self.assertEqual(Product.objects.count(), 2)
+        self.assertEqual(Customer.objects.count(), 3)
+
+    def test_dry_run(self):
+        report = self.sweep(ttl=24 * 3600, dry_run=True)
+        self.assertEqual(report['idle_carts'], 1)
+        self.assertNotIn('carts', report)
+        self.assertEqual(Order.objects.count(), 3)
+
+    def test_archive_is_written_before_the_delete(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'carts.ndjson')
+            archived = []
+
+            def delete(queryset):
+                # Whatever is deleted is in the archive already.
+                with open(path) as archive:
+                    archived.append(archive.read())
+                return original_delete(queryset)
+            original_delete = QuerySet.delete
+            with mock.patch.object(QuerySet, 'delete', autospec=True, side_effect=delete):
+                self.sweep(ttl=24 * 3600, archive=path)
+        cart, = [json.loads(line) for line in archived[0].splitlines()]
+        self.assertEqual(cart['id'], self.idle.pk)
+        self.assertEqual(cart['total_price'], 12)
+        self.assertEqual(cart['items'], [
+            {'code': 'p00000', 'amount': 2, 'unit_price': 4},
+            {'code': 'p00001', 'amount': 1, 'unit_price': 4},
+        ])
+
+    def test_touched_carts_are_kept(self):
+        idle = Order.objects.filter(status=Order.STATUS_SHOPPING, last_activity__lt=timezone.now() - datetime.timedelta(days=1))
+        # The cart was used between the sweeper's two looks at it.
+        Order.objects.filter(pk=self.idle.pk).update(last_activity=timezone.now())
+        self.assertIsNone(Command.sweep_chunk(idle, 10))
+        self.assertTrue(Order.objects.filter(pk=self.idle.pk).exists())
+
+    def test_chunks(self):
+        for username in ('u1', 'u2', 'u3'):
+            Order.objects.create(customer=make_customer(username), status=Order.STATUS_SHOPPING)
+        Order.objects.filter(status=Order.STATUS_SHOPPING).update(last_activity=timezone.now() - datetime.timedelta(days=30))
+        report = self.sweep(ttl=24 * 3600, chunk_size=2)
+        self.assertEqual((report['chunks'], report['carts']), (3, 5))
+        report = self.sweep(ttl=24 * 3600)
+        self.assertEqual((report['idle_carts'], report['carts']), (0, 0))
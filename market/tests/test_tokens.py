@@ -0,0 +1,32 @@
+from market.testing import MarketTestCase
+
+
+class TokenTests(MarketTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.logout()
+        self.token = self.post('/market/customer/token/', {'username': 'ali', 'password': 'secret'}).json()['token']
+        self.auth = {'HTTP_AUTHORIZATION': 'Bearer ' + self.token}
+
+    def test_token_authenticates(self):
+        response = self.client.get('/market/customer/profile/', **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['username'], 'ali')
+
+    def test_bad_credentials(self):
+        response = self.post('/market/customer/token/', {'username': 'ali', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout_revokes_the_token(self):
+        self.assertEqual(self.post('/market/customer/logout/', {}, **self.auth).status_code, 200)
+        self.assertEqual(self.client.get('/market/customer/profile/', **self.auth).status_code, 401)
+
+    def test_tampered_token(self):
+        response = self.client.get('/market/customer/profile/', HTTP_AUTHORIZATION='Bearer ' + self.token + 'x')
+        self.assertEqual(response.status_code, 401)
+
+    def test_token_requests_skip_the_session_and_user(self):
+        # Only the customer row itself is read.
+        with self.assertNumQueries(1):
+            self.client.get('/market/customer/profile/', **self.auth)
@@ -1,12 +1,26 @@
+import datetime
 import json
 
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
 from django.db.models import ObjectDoesNotExist
-from django.http import JsonResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import condition
 
+from .cache import product_cache, product_etag, product_last_modified
+from .dispatch import DispatchQueue
 from .forms import CustomerForm, UserForm, Useredit, CustomerEdit
-from .models import Customer, Order, OrderRow, Product
+from .importer import CONTENT_TYPES, ProductImporter, read_records
+from .metrics import registry
+from .models import Customer, CustomerDailySales, Order, OrderRow, Product, ProductDailySales
+from .pagination import page_params
+from .routers import replica_view
+from .serializers import JsonResponse, ndjson_line
+from .tokens import issue_token, revoke_token
 
 
 """
@@ -18,6 +32,34 @@ from .models import Customer, Order, OrderRow, Product
 """
 
 
+def wants_stream(request):
+    return (request.GET.get('format') == 'ndjson' or
+            request.META.get('HTTP_ACCEPT', '').startswith('application/x-ndjson'))
+
+
+def wants_page(request):
+    return 'limit' in request.GET or 'cursor' in request.GET
+
+
+def wants_columns(request):
+    return request.GET.get('format') == 'columns'
+
+
+def has_filters(request):
+    return bool(set(request.GET) - {'format'})
+
+
+def ndjson_response(rows):
+    return StreamingHttpResponse(map(ndjson_line, rows), content_type='application/x-ndjson')
+
+
+def metrics(request):
+    if request.method == 'GET':
+        return HttpResponse(registry.render() + DispatchQueue().render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    else:
+        return JsonResponse({"message": "wrong request method."}, status=400)
+
+
 def product_insert(request):
     if request.method == 'POST':
         try:
@@ -36,21 +78,56 @@ def product_insert(request):
         return JsonResponse({"message": "wrong request method."}, status=400)
 
 
+def product_import(request):
+    if request.method == 'POST':
+        format = request.GET.get('format') or CONTENT_TYPES.get(request.content_type)
+        try:
+            records = read_records(request, format, request.encoding or 'utf-8')
+        except (ValueError, LookupError):
+            return JsonResponse({"message": "unknown import format."}, status=400)
+        report = ProductImporter(batch_size=settings.MARKET_IMPORT_BATCH_SIZE).run(records)
+        if report['failed']:
+            status = 400
+        else:
+            status = 200
+        return JsonResponse(report, status=status)
+    else:
+        return JsonResponse({"message": "wrong request method."}, status=400)
+
+
+@replica_view
+@condition(etag_func=product_etag, last_modified_func=product_last_modified)
 def product_show(request, pk=None):
     if request.method == 'GET':
         if pk:
             try:
-                return JsonResponse(Product.get_json.query_result(pk=pk), status=200)
+                return JsonResponse(product_cache.get(('product', pk), lambda: Product.get_json.query_result(pk=pk)), status=200)
             except ObjectDoesNotExist:
                 return JsonResponse({"message": "Product Not Found."}, status=404)
-        elif request.GET:
+        elif wants_stream(request):
+            return ndjson_response(Product.get_json.stream_result(keyword=request.GET.get('search')))
+        columns = wants_columns(request)
+        if wants_page(request):
+            try:
+                limit, cursor = page_params(request.GET)
+                keyword = request.GET.get('search')
+                return JsonResponse(product_cache.get(
+                    ('page', limit, cursor, keyword, columns),
+                    lambda: Product.get_json.page_result(limit, cursor, keyword=keyword, columns=columns),
+                ), status=200)
+            except ValueError:
+                return JsonResponse({"message": "bad pagination parameters."}, status=400)
+        elif has_filters(request):
             try:
                 keyword = request.GET['search']
-                return JsonResponse(Product.get_json.product_search_result(keyword=keyword), status=200)
+                return JsonResponse(product_cache.get(
+                    ('search', keyword, columns),
+                    lambda: Product.get_json.product_search_result(keyword=keyword, columns=columns),
+                ), status=200)
             except:
                 return JsonResponse({"message": "Product Not Found."}, status=404)
         else:
-            return JsonResponse(Product.get_json.list_result(), status=200)
+            return JsonResponse(Product.get_json.list_result(columns), status=200)
     else:
         return JsonResponse({"message": "wrong request method."}, status=400)
 
@@ -78,6 +155,27 @@ def product_edit(request, pk):
         return JsonResponse({"message": "wrong request method."}, status=400)
 
 
+def inventory_edit(request):
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body.decode("utf-8"))
+            deltas = {str(code): int(amount) for code, amount in data.items()}
+        except (ValueError, TypeError, AttributeError):
+            return JsonResponse({"message": "bad request data."}, status=400)
+        try:
+            Product.objects.adjust_inventory(deltas, field='code')
+        except ValueError:
+            return JsonResponse({
+                "message": "inventory shortage.",
+                "errors": Product.objects.inventory_shortages(deltas),
+            }, status=400)
+        levels = Product.objects.inventory_levels(deltas)
+        products = [{'code': code, 'inventory': levels[code]} for code in deltas if code in levels]
+        return JsonResponse({'products': products}, status=200)
+    else:
+        return JsonResponse({"message": "wrong request method."}, status=400)
+
+
 def customer_register(request):
     if request.method == 'POST':
         try:
@@ -98,6 +196,7 @@ def customer_register(request):
         return JsonResponse({"message": "wrong request method."}, status=400)
 
 
+@replica_view
 def customer_show(request, pk=None):
     if request.method == 'GET':
         if pk:
@@ -105,14 +204,25 @@ def customer_show(request, pk=None):
                 return JsonResponse(Customer.get_json.query_result(pk=pk), status=200)
             except ObjectDoesNotExist:
                 return JsonResponse({"message": "Customer Not Found."}, status=404)
-        elif request.GET:
+        elif wants_stream(request):
+            return ndjson_response(Customer.get_json.stream_result(keyword=request.GET.get('search')))
+        columns = wants_columns(request)
+        if wants_page(request):
+            try:
+                limit, cursor = page_params(request.GET)
+                return JsonResponse(Customer.get_json.page_result(
+                    limit, cursor, keyword=request.GET.get('search'), columns=columns,
+                ), status=200)
+            except ValueError:
+                return JsonResponse({"message": "bad pagination parameters."}, status=400)
+        elif has_filters(request):
             try:
                 keyword = request.GET['search']
-                return JsonResponse(Customer.get_json.customer_search_result(keyword=keyword), status=200)
+                return JsonResponse(Customer.get_json.customer_search_result(keyword=keyword, columns=columns), status=200)
             except:
                 return JsonResponse({"message": "Customer Not Found."}, status=404)
         else:
-            return JsonResponse(Customer.get_json.list_result(), status=200)
+            return JsonResponse(Customer.get_json.list_result(columns), status=200)
     else:
         return JsonResponse({"message": "wrong request method."}, status=400)
 
@@ -170,8 +280,26 @@ def log_in(request):
         return JsonResponse({"message": "wrong request method."}, status=400)
 
 
+def token_obtain(request):
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body.decode("utf-8"))
+            user = authenticate(request=request, username=data['username'], password=data['password'])
+        except:
+            return JsonResponse({"message": "bad data."}, status=400)
+        if user is None:
+            return JsonResponse({"message": "bad credentials."}, status=401)
+        customer_id = Customer.objects.filter(user=user).values_list('id', flat=True).first()
+        return JsonResponse(issue_token(user, customer_id), status=200)
+    else:
+        return JsonResponse({"message": "wrong request method."}, status=400)
+
+
 def log_out(request):
     if request.method == 'POST':
+        if request.auth is not None:
+            revoke_token(request.auth)
+            return JsonResponse({"message": "You are logged out successfully."}, status=200)
         if request.user.is_authenticated:
             logout(request=request)
             return JsonResponse({"message": "You are logged out successfully."}, status=200)
@@ -184,7 +312,9 @@ def log_out(request):
 def customer_profile(request):
     if request.method == 'GET':
         if request.user.is_authenticated:
-            pk = Customer.objects.get(user=request.user).id
+            pk = request.shopper.customer_id
+            if pk is None:
+                return JsonResponse({"message": "Customer Not Found."}, status=404)
             return JsonResponse(Customer.get_json.query_result(pk=pk), status=200)
         else:
             return JsonResponse({"message": "You are not logged in."}, status=403)
@@ -195,7 +325,7 @@ def customer_profile(request):
 def cart_show(request):
     if request.method == 'GET':
         if request.user.is_authenticated:
-            customer = Customer.objects.get(user=request.user)
+            customer = request.shopper.customer_id
             return JsonResponse(Order.get_json.customer_cart(customer=customer), status=200)
         else:
             return JsonResponse({"message": "You are not logged in."}, status=403)
@@ -203,28 +333,38 @@ def cart_show(request):
         return JsonResponse({"message": "wrong request method."}, status=400)
 
 
-def get_or_create_order(user):
-    customer = Customer.objects.get(user=user)
-    try:
-        return customer.orders.get(status=1)
-    except:
-        return Order.initiate(customer=customer)
+def order_history(request):
+    if request.method == 'GET':
+        if request.user.is_authenticated:
+            statuses = {name: value for value, name in Order.get_json.status_names.items()}
+            status = request.GET.get('status')
+            if status is not None:
+                status = statuses.get(status) or (int(status) if status.isdigit() else None)
+                if status not in Order.get_json.status_names:
+                    return JsonResponse({"message": "unknown order status."}, status=400)
+            try:
+                limit, cursor = page_params(request.GET)
+                return JsonResponse(Order.get_json.history_result(
+                    request.shopper.customer_id, limit, cursor, status=status,
+                ), status=200)
+            except (ValueError, ValidationError):
+                return JsonResponse({"message": "bad pagination parameters."}, status=400)
+        else:
+            return JsonResponse({"message": "You are not logged in."}, status=403)
+    else:
+        return JsonResponse({"message": "wrong request method."}, status=400)
+
+
+def get_or_create_order(request):
+    return request.shopper.open_order()
 
 
 def add_items(request):
     if request.method == 'POST':
         if request.user.is_authenticated:
-            order = get_or_create_order(user=request.user)
+            order = get_or_create_order(request)
             data = json.loads(request.body.decode("utf-8"))
-            errors = []
-            for item in data:
-                try:
-                    code = item['code']
-                    amount = int(item['amount'])
-                    product = Product.objects.get(code=code)
-                    order.add_product(product=product, amount=amount)
-                except Exception as error:
-                    errors.append({'code': code, 'message': error.args[0]})
+            errors = order.add_products(data)
             if errors:
                 status = 400
             else:
@@ -239,19 +379,9 @@ def add_items(request):
 def remove_items(request):
     if request.method == 'POST':
         if request.user.is_authenticated:
-            order = get_or_create_order(user=request.user)
+            order = get_or_create_order(request)
             data = json.loads(request.body.decode("utf-8"))
-            errors = []
-            for item in data:
-                try:
-                    code = item['code']
-                    amount = item.get('amount')
-                    if amount != None:
-                        amount = int(amount)
-                    product = Product.objects.get(code=code)
-                    order.remove_product(product=product, amount=amount)
-                except Exception as error:
-                    errors.append({'code': code, 'message': error.args[0]})
+            errors = order.remove_products(data)
             if errors:
                 status = 400
             else:
@@ -266,7 +396,7 @@ def remove_items(request):
 def submit(request):
     if request.method == 'POST':
         if request.user.is_authenticated:
-            order = get_or_create_order(user=request.user)
+            order = get_or_create_order(request)
             try:
                 order.submit()
             except:
@@ -276,3 +406,65 @@ def submit(request):
             return JsonResponse({"message": "You are not logged in."}, status=403)
     else:
         return JsonResponse({"message": "wrong request method."}, status=400)
+
+
+def sales_range(request):
+    # ?start= and ?end= (YYYY-MM-DD, inclusive); the last 30 days by default.
+    end = parse_date(request.GET['end']) if 'end' in request.GET else timezone.localdate()
+    start = parse_date(request.GET['start']) if 'start' in request.GET else end and end - datetime.timedelta(days=29)
+    if start is None or end is None or start > end:
+        raise ValueError('bad date range.')
+    return start, end
+
+
+def sales_limit(request):
+    limit = int(request.GET.get('limit', settings.MARKET_SEARCH_LIMIT))
+    if limit < 1 or limit > settings.MARKET_MAX_PAGE_SIZE:
+        raise ValueError('limit out of range.')
+    return limit
+
+
+def sales_products(request):
+    if request.method == 'GET':
+        try:
+            start, end = sales_range(request)
+            limit = sales_limit(request)
+        except ValueError:
+            return JsonResponse({"message": "bad request data."}, status=400)
+        filters = {'product__code': request.GET['code']} if 'code' in request.GET else {}
+        return JsonResponse({
+            'start': start, 'end': end,
+            'products': ProductDailySales.objects.totals_result(start, end, limit, **filters),
+        }, status=200)
+    else:
+        return JsonResponse({"message": "wrong request method."}, status=400)
+
+
+def sales_daily(request):
+    if request.method == 'GET':
+        try:
+            start, end = sales_range(request)
+        except ValueError:
+            return JsonResponse({"message": "bad request data."}, status=400)
+        filters = {'product__code': request.GET['code']} if 'code' in request.GET else {}
+        return JsonResponse({
+            'start': start, 'end': end,
+            'days': ProductDailySales.objects.series_result(start, end, **filters),
+        }, status=200)
+    else:
+        return JsonResponse({"message": "wrong request method."}, status=400)
+
+
+def sales_customers(request):
+    if request.method == 'GET':
+        try:
+            start, end = sales_range(request)
+            limit = sales_limit(request)
+        except ValueError:
+            return JsonResponse({"message": "bad request data."}, status=400)
+        return JsonResponse({
+            'start': start, 'end': end,
+            'customers': CustomerDailySales.objects.totals_result(start, end, limit),
+        }, status=200)
+    else:
+        return JsonResponse({"message": "wrong request method."}, status=400)
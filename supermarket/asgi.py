@@ -0,0 +1,17 @@
+"""
+ASGI config for supermarket project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'supermarket.settings')
+os.environ.setdefault('MARKET_ASYNC_VIEWS', '1')
+
+application = get_asgi_application()
@@ -41,11 +41,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'market.middleware.MetricsMiddleware',
+    'market.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
 #    'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'market.middleware.TokenAuthenticationMiddleware',
+    'market.middleware.ShopperMiddleware',
+    'market.middleware.ReadYourWritesMiddleware',
+    'market.middleware.QueryCheckMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -70,6 +76,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'supermarket.wsgi.application'
 
+ASGI_APPLICATION = 'supermarket.asgi.application'
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
@@ -81,6 +89,28 @@ DATABASES = {
     }
 }
 
+# Read replicas of the primary, as a comma-separated list of SQLite files
+# (kept up to date by the sync_replica command); tests use the primary.
+for number, name in enumerate(filter(None, os.environ.get('MARKET_REPLICA_DATABASES', '').split(',')), 1):
+    DATABASES['replica{}'.format(number)] = dict(DATABASES['default'], NAME=name.strip(), TEST={'MIRROR': 'default'})
+
+DATABASE_ROUTERS = ['market.routers.ReplicaRouter']
+
+DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+
+
+# Sessions
+# https://docs.djangoproject.com/en/4.2/topics/http/sessions/
+
+# 'cached_db' reads sessions from the cache and falls back to the database;
+# 'cache' skips the database entirely. Both need a cache shared by every
+# process (MARKET_REDIS_URL): with LocMemCache a session logged out in one
+# worker stays valid in the others, so they are only used with Redis.
+MARKET_SESSION_BACKEND = os.environ.get('MARKET_SESSION_BACKEND', 'db')
+if MARKET_SESSION_BACKEND != 'db' and not os.environ.get('MARKET_REDIS_URL'):
+    MARKET_SESSION_BACKEND = 'db'
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + MARKET_SESSION_BACKEND
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -110,8 +140,6 @@ TIME_ZONE = 'UTC'
 
 USE_I18N = True
 
-USE_L10N = True
-
 USE_TZ = True
 
 
@@ -119,3 +147,101 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
 STATIC_URL = '/static/'
+
+
+# Market
+
+MARKET_PAGE_SIZE = 100
+
+MARKET_MAX_PAGE_SIZE = 1000
+
+MARKET_STREAM_CHUNK_SIZE = 2000
+
+# Dotted path to a market.search backend; None picks one for the database
+# vendor (SQLite FTS5, PostgreSQL pg_trgm, or a plain icontains scan).
+MARKET_SEARCH_BACKEND = None
+
+MARKET_SEARCH_LIMIT = 50
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+# The product cache's version counter and the revoked token denylist live
+# here, so with more than one worker process this must be a shared backend
+# (set MARKET_REDIS_URL); LocMemCache only invalidates the process that made
+# the change, and a token revoked in one process is still accepted by the
+# others.
+if os.environ.get('MARKET_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['MARKET_REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+MARKET_CACHE_ALIAS = 'default'
+
+MARKET_CACHE_TIMEOUT = 300
+
+# Worker processes serving the site (gunicorn's WEB_CONCURRENCY); with more
+# than one, the market.W001 check warns about per-process caches.
+MARKET_WORKERS = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+# Entries kept by the in-process tier in front of the cache backend.
+MARKET_CACHE_LRU_SIZE = 1024
+
+MARKET_IMPORT_BATCH_SIZE = 1000
+
+# Products changed by one conditional UPDATE in batch inventory changes.
+MARKET_INVENTORY_BATCH_SIZE = 500
+
+# Serve the read endpoints with their async views; supermarket/asgi.py
+# turns this on for the ASGI deployment.
+MARKET_ASYNC_VIEWS = os.environ.get('MARKET_ASYNC_VIEWS') == '1'
+
+# Threads running the synchronous database work of the async views.
+MARKET_ASYNC_DB_WORKERS = 16
+
+# Lifetime in seconds of the bearer tokens issued by customer/token/.
+MARKET_TOKEN_MAX_AGE = 3600
+
+# Collect per-view request metrics, served at /metrics.
+MARKET_METRICS = True
+
+# Report N+1 query patterns per request (log and X-Query-Check header); for
+# development and CI.
+MARKET_QUERY_CHECK = os.environ.get('MARKET_QUERY_CHECK') == '1'
+
+# Times one query shape may run in a request before it is reported.
+MARKET_QUERY_CHECK_THRESHOLD = 5
+
+# Dotted path to the function encoding JSON responses; None uses the
+# standard library. 'market.serializers.orjson_dumps' needs orjson.
+MARKET_JSON_ENCODER = None
+
+# Compress responses (brotli when installed, else gzip) for clients that
+# accept it; smaller bodies are sent as they are.
+MARKET_COMPRESSION = True
+
+MARKET_COMPRESS_MIN_SIZE = 1024
+
+# Seconds a dispatch worker's claim on submitted orders lasts before another
+# worker may take them over.
+MARKET_DISPATCH_LEASE = 300
+
+# Seconds a shopping cart may go unchanged before sweep_carts deletes it.
+MARKET_CART_TTL = 14 * 24 * 3600
+
+# Database aliases the catalog and customer views read from.
+MARKET_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+# Seconds a client's reads stay on the primary after it changes something;
+# keep it above the replicas' lag.
+MARKET_REPLICA_LAG = 10
@@ -16,8 +16,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from market import views as market_views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('market/', include('market.urls')),
     path('accounts/', include('market.urls')),
+    path('metrics', market_views.metrics, name='metrics'),
 ]